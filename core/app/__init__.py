@@ -10,8 +10,13 @@ class App(Application):
     def __init__(self, port: int) -> None:
         handlers = [
             (r'/api/interfaces/', handler.Interfaces),
+            (r'/api/interfaces/series/', handler.InterfaceSeries),
             (r'/api/connections/', handler.Connections),
             (r'/api/packages/', handler.Packages),
+            (r'/api/packages/series/', handler.PackageSeries),
+            (r'/api/packages/top/', handler.TopTalkers),
+            (r'/api/packages/distinct/', handler.DistinctPeers),
+            (r'/api/packages/stats/', handler.PackageStats),
             (r'/api/users/', handler.User),
             (r'/api/login/', handler.Login),
         ]
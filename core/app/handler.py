@@ -1,9 +1,13 @@
 import json
-from typing import Dict
+from abc import ABCMeta, abstractmethod
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
 
-from core.models.auth import Auth as AuthModel
-from core.models.network import Network as NetworkModel
-from core.utils import AuthHash, BaseHandler
+from core.models import Auth as AuthModel, Network as NetworkModel
+from core.utils import AuthHash, BaseHandler, errors
+from core.utils.query import date
+from core.utils.ring import SampleRing
+from settings.config import CONF
 
 
 ###########
@@ -14,6 +18,123 @@ class Interfaces(BaseHandler):
     Handler da rota de interfaces.
     """
     _model = NetworkModel()
+    _params = ['start', 'end', 'step']
+    _schema = {
+        'interface': str,
+        'download': int,
+        'updaload': int,
+        'upload_speed': float,
+        'download_speed': float,
+        'timestamp': float,
+    }
+    # Campos que os documentos das faixas de agregação também têm, com as
+    # velocidades como mínimo, máximo, média e p95, e os filtros que valem
+    # igual nas duas formas.
+    _rollup_fields = ('_id', 'interface', 'upload_speed', 'download_speed', 'timestamp')
+    _rollup_filters = ('interface', 'timestamp')
+    _ring = None
+
+    @classmethod
+    def _latest(cls) -> SampleRing | None:
+        """
+        Anel das últimas amostras do coletor, reaberto se o coletor reiniciou.
+        """
+        if cls._ring is not None and not cls._ring.alive:
+            cls._ring.close()
+            cls._ring = None
+
+        if cls._ring is None and CONF.latest_buffer_size > 0:
+            cls._ring = SampleRing.attach()
+
+        return cls._ring
+
+    @staticmethod
+    def _tier(start: float, step: float) -> int | None:
+        """
+        Maior faixa de agregação que cabe no passo pedido e ainda guarda o
+        início do período. Sem nenhuma, a consulta usa as amostras cruas.
+        """
+        _age = datetime.now().timestamp() - start
+        _tiers = [t for t, r in CONF.rollup_tiers.items() if t <= step and r >= _age]
+
+        return max(_tiers) if _tiers else None
+
+    async def _interfaces(
+            self,
+            start: float | None,
+            end: float | None,
+            step: float | None,
+            query: Dict,
+            fields: Dict,
+            sort: List[Tuple[str, int]],
+        ) -> Dict:
+        """
+        Resposta sem paginação: faixa de agregação, anel ou amostras cruas.
+        """
+        _tier = None
+        _truncated = False
+
+        if any(v is not None for v in (start, end, step)):
+            end = datetime.now().timestamp() if end is None else end
+            start = end - 3600 if start is None else start
+            # Sem passo, usa o que cabe no limite de resposta.
+            step = (end - start) / CONF.db_response_limit if step is None else step
+
+            # Ordenação, filtros e campos das amostras cruas não existem nas faixas.
+            if not sort \
+                    and all(f in self._rollup_filters for f in query) \
+                    and all(f in self._rollup_fields for f, v in fields.items() if v):
+                _tier = self._tier(start, step)
+
+        _ring = self._latest() if not sort else None
+        _oldest = _ring.oldest() if _ring else None
+        _ifaces = None
+
+        if _tier:
+            # Um a mais que o limite, para saber se os mais antigos ficaram de fora.
+            _ifaces = await self._model.get_interface_rollups(
+                _tier,
+                start,
+                end,
+                query,
+                fields,
+                CONF.db_response_limit + 1,
+            )
+
+            if not _ifaces:
+                # Faixa ainda sem buckets fechados: usa as amostras cruas.
+                _tier, _ifaces = None, None
+            elif len(_ifaces) > CONF.db_response_limit:
+                _ifaces, _truncated = _ifaces[1:], True
+
+        if _ifaces is None and _ring and (start is None or (_oldest is not None and start >= _oldest)):
+            # Últimas amostras e períodos curtos saem da memória compartilhada.
+            _ifaces = _ring.latest(CONF.db_response_limit, start, end, query)
+
+            # O anel só guarda as últimas amostras: um filtro sem período
+            # que não completou a resposta ainda pode achar mais no banco.
+            # Sem resposta, o anel não tem todas as interfaces.
+            if _ifaces is None or (start is None and query and len(_ifaces) < CONF.db_response_limit):
+                _ifaces = None
+            elif fields:
+                _ifaces = [{k: v for k, v in i.items() if fields.get(k)} for i in _ifaces]
+
+        if _ifaces is None:
+            if start is not None:
+                query['date'] = {
+                    '$gte': datetime.fromtimestamp(start, timezone.utc),
+                    '$lt': datetime.fromtimestamp(end, timezone.utc),
+                }
+
+            _ifaces = await self._model.get_interfaces(query, fields, sort)
+
+        _response = self.data_response(_ifaces)
+
+        if _tier:
+            _response['tier'] = _tier
+            _response['truncated'] = _truncated
+
+        return _response
 
     async def get(self) -> Dict:
         """
@@ -22,11 +143,112 @@ class Interfaces(BaseHandler):
         if not await self.is_a_valid_login():
             return
 
+        _range = [self.get_argument(p, None) for p in self._params]
+
         try:
-            _ifaces = await self._model.get_interfaces()
-            _filters = self.get_filters()
-            self.set_status(200)
-            self.finish(self.data_filter(_ifaces, _filters))
+            _range = [float(v) if v is not None else None for v in _range]
+        except ValueError:
+            self.set_status(400)
+            self.finish({
+                'error': ['Invalid filter!'],
+            })
+            return
+
+        _start, _end, _step = _range
+
+        try:
+            _query, _sort = self.get_query(self._schema)
+            _fields = self.get_fields(self._schema)
+            _page = self.get_page('timestamp', _sort)
+        except errors.InvalidFilter as e:
+            self.set_status(400)
+            self.finish({
+                'error': e.args,
+            })
+            return
+
+        try:
+            if _page:
+                # As páginas saem das amostras cruas, sem faixa de agregação.
+                _bounds = {'$gte': _start, '$lt': _end}
+                _bounds = {k: v for k, v in _bounds.items() if v is not None}
+
+                if _bounds:
+                    _current = _query.get('timestamp')
+                    _query['timestamp'] = dict(_current, **_bounds) if isinstance(_current, dict) else _bounds
+
+                await self.write_page(self._model, 'interface', 'timestamp', _query, _page, _fields)
+                return
+
+            await self.finish_cached(lambda: self._interfaces(_start, _end, _step, _query, _fields, _sort))
+        except Exception as e:
+            self.set_status(500)
+            self.finish({
+                'error': e.args
+            })
+
+
+class _Series(BaseHandler, metaclass=ABCMeta):
+    """
+    Base das rotas de séries, agregadas no banco em intervalos de `step`
+    segundos entre `start` e `end`, por padrão a última hora.
+    """
+    _model = NetworkModel()
+    _params = ['start', 'end', 'step']
+    _schema: Dict = {}
+
+    @abstractmethod
+    async def _series(self, start: float, end: float, step: float, query: Dict, limit: int) -> List[Dict]:
+        """
+        Consulta a série no modelo.
+        """
+
+    async def get(self) -> Dict:
+        if not await self.is_a_valid_login():
+            return
+
+        try:
+            _end = float(self.get_argument('end', datetime.now().timestamp()))
+            _start = float(self.get_argument('start', _end - 3600))
+            _step = float(self.get_argument('step', (_end - _start) / CONF.db_response_limit))
+            _query, _ = self.get_query(self._schema)
+        except (ValueError, errors.InvalidFilter):
+            _step = 0
+
+        # Cada intervalo vira ao menos um ponto por grupo, então a quantidade
+        # de intervalos é limitada. Os grupos só são conhecidos no banco.
+        if _step <= 0 or _start >= _end or (_end - _start) / _step > CONF.page_max_limit:
+            self.set_status(400)
+            self.finish({
+                'error': ['Invalid filter!'],
+            })
+            return
+
+        async def _produce() -> Dict:
+            # Um a mais que o limite, para saber se algum ponto ficou de fora.
+            _series = await self._series(_start, _end, _step, _query, CONF.page_max_limit + 1)
+            _truncated = len(_series) > CONF.page_max_limit
+
+            if _truncated:
+                # Descarta o último intervalo, que ficou pela metade, se houver outros.
+                _cut = _series[CONF.page_max_limit]['timestamp']
+                _series = [p for p in _series[:CONF.page_max_limit] if p['timestamp'] != _cut] \
+                    or _series[:CONF.page_max_limit]
+
+            return {
+                'data': _series,
+                'count': len(_series),
+                'step': _step,
+                'truncated': _truncated,
+            }
+
+        try:
+            await self.finish_cached(_produce)
+        except errors.InvalidFilter as e:
+            self.set_status(400)
+            self.finish({
+                'error': e.args,
+            })
         except Exception as e:
             self.set_status(500)
             self.finish({
@@ -34,21 +256,83 @@ class Interfaces(BaseHandler):
             })
 
 
+class InterfaceSeries(_Series):
+    """
+    Handler da série das velocidades das interfaces.
+    """
+    _schema = {k: v for k, v in Interfaces._schema.items() if k != 'timestamp'}
+
+    async def _series(self, start: float, end: float, step: float, query: Dict, limit: int) -> List[Dict]:
+        return await self._model.get_interface_series(start, end, step, query, limit)
+
+
 class Connections(BaseHandler):
     """
     Handler da rota de conexões.
     """
     _model = NetworkModel()
+    _params = ['kind']
+    _collections = {
+        'state': ('process', 'last_seen'),
+        'events': ('connection_event', 'timestamp'),
+    }
+    _schemas = {
+        'state': {
+            'local_host': str,
+            'remote_host': str,
+            'pid': int,
+            'status': str,
+            'name': str,
+            'exe': str,
+            'username': str,
+            'first_seen': date,
+            'last_seen': date,
+        },
+        'events': {
+            'local_host': str,
+            'remote_host': str,
+            'pid': int,
+            'status': str,
+            'previous_status': str,
+            'name': str,
+            'exe': str,
+            'username': str,
+            'event': str,
+            'timestamp': float,
+        },
+    }
 
     async def get(self) -> Dict:
         if not await self.is_a_valid_login():
             return
 
+        _kind = self.get_argument('kind', 'state')
+        _collection, _time = self._collections.get(_kind, self._collections['state'])
+
         try:
-            _connections = await self._model.get_processes()
-            _filters = self.get_filters()
-            self.set_status(200)
-            self.finish(self.data_filter(_connections, _filters))
+            _schema = self._schemas.get(_kind, self._schemas['state'])
+            _query, _sort = self.get_query(_schema)
+            _fields = self.get_fields(_schema)
+            _page = self.get_page(_time, _sort)
+        except errors.InvalidFilter as e:
+            self.set_status(400)
+            self.finish({
+                'error': e.args,
+            })
+            return
+
+        try:
+            if _page:
+                await self.write_page(self._model, _collection, _time, _query, _page, _fields)
+                return
+
+            async def _produce() -> Dict:
+                if _kind == 'events':
+                    return self.data_response(await self._model.get_connection_events(_query, _fields, _sort))
+
+                return self.data_response(await self._model.get_processes(_query, _fields, _sort))
+
+            await self.finish_cached(_produce)
         except Exception as e:
             self.set_status(500)
             self.finish({
@@ -61,16 +345,220 @@ class Packages(BaseHandler):
     Handler da rota de pacotes.
     """
     _model = NetworkModel()
+    _params = ['kind']
+    _schemas = {
+        'raw': {
+            'interface': str,
+            'source': str,
+            'destiny': str,
+            'src_ip': str,
+            'dst_ip': str,
+            'protocol': int,
+            'sport': int,
+            'dport': int,
+            'pkg_len': int,
+            'sampling_rate': int,
+            'timestamp': float,
+        },
+        'flow': {
+            'interface': str,
+            'source': str,
+            'destiny': str,
+            'protocol': int,
+            'sport': int,
+            'dport': int,
+            'packets': int,
+            'bytes': int,
+            'sampled': int,
+            'sampling_rate': float,
+            'first_seen': float,
+            'last_seen': float,
+            'timestamp': float,
+        },
+    }
 
     async def get(self) -> Dict:
         if not await self.is_a_valid_login():
             return
 
+        _kind = self.get_argument('kind', 'raw')
+
+        try:
+            _schema = self._schemas.get(_kind, self._schemas['raw'])
+            _query, _sort = self.get_query(_schema)
+            _fields = self.get_fields(_schema)
+            _page = self.get_page('timestamp', _sort)
+        except errors.InvalidFilter as e:
+            self.set_status(400)
+            self.finish({
+                'error': e.args,
+            })
+            return
+
         try:
-            _packages = await self._model.get_packages()
-            _filters = self.get_filters()
+            if _page:
+                _collection = 'flow' if _kind == 'flow' else 'package'
+                await self.write_page(self._model, _collection, 'timestamp', _query, _page, _fields)
+                return
+
+            async def _produce() -> Dict:
+                if _kind == 'flow':
+                    return self.data_response(await self._model.get_flows(_query, _fields, _sort))
+
+                return self.data_response(await self._model.get_packages(_query, _fields, _sort))
+
+            await self.finish_cached(_produce)
+        except Exception as e:
+            self.set_status(500)
+            self.finish({
+                'error': e.args
+            })
+
+
+class PackageSeries(_Series):
+    """
+    Handler da série dos pacotes, agrupados por `by`.
+    """
+    _params = ['start', 'end', 'step', 'by']
+    _schema = {k: v for k, v in Packages._schemas['raw'].items() if k != 'timestamp'}
+    _keys = ('interface', 'source', 'destiny', 'src_ip', 'dst_ip', 'protocol', 'sport', 'dport')
+
+    async def _series(self, start: float, end: float, step: float, query: Dict, limit: int) -> List[Dict]:
+        _by = self.get_argument('by', 'interface')
+
+        if _by not in self._keys:
+            raise errors.InvalidFilter('Invalid filter!')
+
+        return await self._model.get_package_series(start, end, step, _by, query, limit)
+
+
+class TopTalkers(BaseHandler):
+    """
+    Handler dos maiores consumidores de banda.
+    """
+    _model = NetworkModel()
+    _dimensions = ('source', 'destiny', 'pair')
+    _metrics = ('bytes', 'packets')
+
+    async def get(self) -> Dict:
+        if not await self.is_a_valid_login():
+            return
+
+        _dimension = self.get_argument('dimension', 'source')
+        _metric = self.get_argument('metric', 'bytes')
+
+        try:
+            _k = int(self.get_argument('k', 10))
+            _windows = int(self.get_argument('windows', 1))
+        except ValueError:
+            _k = _windows = 0
+
+        if _dimension not in self._dimensions \
+                or _metric not in self._metrics \
+                or _k < 1 or _windows < 1:
+            self.set_status(400)
+            self.finish({
+                'error': ['Invalid filter!'],
+            })
+            return
+
+        try:
+            _top = await self._model.get_top_talkers(_dimension, _metric, _k, _windows)
             self.set_status(200)
-            self.finish(self.data_filter(_packages, _filters))
+            self.finish({
+                'data': _top,
+                'count': len(_top),
+            })
+        except Exception as e:
+            self.set_status(500)
+            self.finish({
+                'error': e.args
+            })
+
+
+class DistinctPeers(BaseHandler):
+    """
+    Handler da quantidade de origens ou destinos distintos por interface.
+    """
+    _model = NetworkModel()
+    _kinds = ('source', 'destiny')
+
+    async def get(self) -> Dict:
+        if not await self.is_a_valid_login():
+            return
+
+        _kind = self.get_argument('kind', 'source')
+        _interface = self.get_argument('interface', None)
+
+        try:
+            _end = float(self.get_argument('end', datetime.now().timestamp()))
+            _start = float(self.get_argument('start', _end - 3600))
+        except ValueError:
+            _start = _end = 0
+
+        if _kind not in self._kinds or _start >= _end:
+            self.set_status(400)
+            self.finish({
+                'error': ['Invalid filter!'],
+            })
+            return
+
+        try:
+            _distinct = await self._model.get_distinct_peers(_kind, _start, _end, _interface)
+            self.set_status(200)
+            self.finish({
+                'data': _distinct,
+            })
+        except Exception as e:
+            self.set_status(500)
+            self.finish({
+                'error': e.args
+            })
+
+
+class PackageStats(BaseHandler):
+    """
+    Handler dos contadores de captura e de perdas.
+    """
+    _model = NetworkModel()
+    _schema = {
+        'worker': int,
+        'interface': str,
+        'mode': str,
+        'captured': int,
+        'enqueued': int,
+        'persisted': int,
+        'dropped': int,
+        'failed': int,
+        'kernel_packets': int,
+        'kernel_drops': int,
+        'timestamp': float,
+    }
+
+    async def get(self) -> Dict:
+        if not await self.is_a_valid_login():
+            return
+
+        try:
+            _query, _sort = self.get_query(self._schema)
+            _fields = self.get_fields(self._schema)
+            _page = self.get_page('timestamp', _sort)
+        except errors.InvalidFilter as e:
+            self.set_status(400)
+            self.finish({
+                'error': e.args,
+            })
+            return
+
+        try:
+            if _page:
+                await self.write_page(self._model, 'capture_stats', 'timestamp', _query, _page, _fields)
+                return
+
+            async def _produce() -> Dict:
+                return self.data_response(await self._model.get_capture_stats(_query, _fields, _sort))
+
+            await self.finish_cached(_produce)
         except Exception as e:
             self.set_status(500)
             self.finish({
@@ -88,16 +576,28 @@ class User(BaseHandler):
     _requireds = ['username', 'password']
     _invalidpld_msg = 'Invalid payload'
     _model = AuthModel()
+    _schema = {
+        'username': str,
+    }
 
     async def get(self) -> Dict:
         if not await self.is_a_valid_login():
             return
 
         try:
-            _users = await self._model.get_user()
-            _filters = self.get_filters()
+            _query, _sort = self.get_query(self._schema)
+            _fields = self.get_fields(self._schema)
+        except errors.InvalidFilter as e:
+            self.set_status(400)
+            self.finish({
+                'error': e.args,
+            })
+            return
+
+        try:
+            _users = await self._model.get_user(_query, _fields, _sort)
             self.set_status(200)
-            self.finish(self.data_filter(_users, _filters))
+            self.finish(self.data_response(_users))
         except Exception as e:
             self.set_status(500)
             self.finish({
@@ -2,8 +2,7 @@ import logging
 from multiprocessing import Process
 
 from core.app import App
-from core.models.auth import Auth as AuthModel
-from core.models.network import Network as NetworkModel
+from core.models import Auth as AuthModel, Network as NetworkModel
 from core.daemons import Network
 
 
@@ -34,10 +33,12 @@ class Cmd:
         _net = Network()
         
         try:
+            _workers = _net.capture_workers()
             _daemons = [
-                Process(target=_net.interfaces),
-                Process(target=_net.connections),
-                Process(target=_net.processes)
+                Process(target=_net.collectors),
+            ] + [
+                Process(target=_net.processes, args=(i, _workers))
+                for i in range(_workers)
             ]
 
             for _d in _daemons:
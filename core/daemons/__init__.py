@@ -1,13 +1,32 @@
 import asyncio
 import logging
+import os
+import socket
+import sys
 import time
-from datetime import datetime
-from typing import Any, Dict
+from datetime import datetime, timezone
+from functools import partial
+from typing import Any, Callable, Coroutine, Dict, List
 
 import psutil
 import scapy.all as sp
 
-from core.models.network import Network as NetworkModel
+from core.daemons import procfs
+from core.daemons.bpf import capture_filter
+from core.daemons.capture import join_fanout, socket_sniff, tpacket_sniff
+from core.daemons.connections import ConnectionTracker
+from core.daemons.decoder import PacketRecord
+from core.daemons.flow import FlowTable
+from core.daemons.processes import ProcessCache
+from core.daemons.rollup import InterfaceRollup
+from core.daemons.sampling import Sampler
+from core.daemons.scheduler import Scheduler
+from core.daemons.sketch import DistinctPeers, TopTalkers
+from core.daemons.spool import Spool
+from core.daemons.stats import CaptureStats
+from core.daemons.writer import BatchWriter
+from core.models import Network as NetworkModel
+from core.utils.ring import SampleRing
 from settings.config import CONF
 
 _log = logging.getLogger(__name__)
@@ -18,84 +37,296 @@ class Network:
     def __init__(self) -> None:
         self._units = ['', 'K', 'M', 'G', 'T', 'P']
         self._io = psutil.net_io_counters(pernic=True)
+        self._io_time = time.monotonic()
         self._model = NetworkModel()
+        self._scheduler = None
+        self._tracker = None
+        self._rollup = None
+        self._processes = None
+        self._net_io_counters = None
+        self._net_connections = None
+        self._spool = None
+        self._ring = None
+        self._set_packages = self._model.set_packages
+        self._writer = None
+        self._flows = None
+        self._sampler = None
+        self._stats = None
+        self._top = None
+        self._peers = None
 
     async def __interfaces(self) -> None:
         """
         Processa o status de rede das interfaces disponíveis.
         """
+        io = await self._scheduler.blocking(self._net_io_counters)
+        _now = time.monotonic()
+        # Usa o tempo real entre as amostras, não o intervalo configurado.
+        _elapsed = (_now - self._io_time) or CONF.refresh_time
+        _date = datetime.now(timezone.utc)
+        _timestamp = _date.timestamp()
         _interfaces = []
-        
-        while True:
-            io = psutil.net_io_counters(pernic=True)
-
-            for _if, _if_io in self._io.items():
-                uspeed, dspeed = io[_if].bytes_sent - _if_io.bytes_sent, io[_if].bytes_recv - _if_io.bytes_recv
-                _interfaces.append({
-                    'interface': _if,
-                    'download': io[_if].bytes_recv,
-                    'updaload': io[_if].bytes_sent,
-                    'upload_speed': (uspeed / CONF.refresh_time),
-                    'download_speed': (dspeed / CONF.refresh_time),
-                    'timestamp': datetime.now().timestamp()
+        _rollups = []
+
+        for _if, _if_io in self._io.items():
+            if _if not in io:
+                continue
+
+            uspeed, dspeed = io[_if].bytes_sent - _if_io.bytes_sent, io[_if].bytes_recv - _if_io.bytes_recv
+            _interfaces.append({
+                'interface': _if,
+                'download': io[_if].bytes_recv,
+                'updaload': io[_if].bytes_sent,
+                'upload_speed': (uspeed / _elapsed),
+                'download_speed': (dspeed / _elapsed),
+                'timestamp': _timestamp,
+                'date': _date,
+            })
+            _rollups.extend(self._rollup.add(dict(
+                _interfaces[-1],
+                upload_bytes=uspeed,
+                download_bytes=dspeed,
+            )))
+
+        self._io, self._io_time = io, _now
+
+        if self._ring:
+            self._ring.append(_interfaces)
+
+        await self.__save('interface', _interfaces, self._model.set_interfaces)
+        await self.__save('interface_rollup', _rollups, self._model.set_interface_rollups)
+
+    @staticmethod
+    def __psutil_connections() -> List[Dict]:
+        _connections = []
+
+        for _c in psutil.net_connections():
+            if _c.laddr and _c.raddr and _c.pid:
+                # Se endereço local e endereço remoto e tem PID
+                # add no dicionário de conexões.
+                _connections.append({
+                    'local_host': f'{_c.laddr.ip}:{_c.laddr.port}',
+                    'remote_host': f'{_c.raddr.ip}:{_c.raddr.port}',
+                    'pid': _c.pid,
+                    'status': _c.status,
                 })
 
-            await self._model.set_interfaces(_interfaces)
-            self._io = io
-            time.sleep(CONF.refresh_time)
-            _interfaces.clear()
+        return _connections
 
     async def __connections(self) -> None:
         """
         Pega as conexões.
         """
-        _connections = []
+        _connections = await self._scheduler.blocking(self._net_connections)
+        _processes = await self._scheduler.blocking(self._processes.lookup, [c['pid'] for c in _connections])
+
+        for _c in _connections:
+            _c.update(_processes.get(_c['pid']) or dict.fromkeys(ProcessCache.attrs))
+
+        # Só grava o que mudou desde a leitura anterior.
+        _events, _changed, _closed = self._tracker.diff(_connections)
+        await self.__save('connection_event', _events, self._model.set_connection_events)
+        # O estado atual não passa pelo spool, o próximo checkpoint o refaz.
+        # Em ordem, para um fechamento não chegar antes da abertura.
+        await self._scheduler.write(self._model.set_connections(_changed, _closed), ordered=True)
+
+    def __pkg_store(self, record: PacketRecord) -> None:
+        """
+        Insere os pacotes da máquina em uma collection, ou agrega no fluxo
+        correspondente quando o modo de fluxo estiver ativo.
+        """
+        record.sampling_rate = self._sampler.weight
+        self._stats.captured(record.interface)
+
+        if self._top:
+            self._top.add(record)
+
+        if self._peers:
+            self._peers.add(record)
+
+        if self._flows:
+            self._flows.add(record)
+        else:
+            self._writer.put(record)
+
+    def __pkg_flush(self, records: List[PacketRecord]) -> List[int]:
+        """
+        Converte os registros em documentos só no momento da gravação.
+        """
+        return self._set_packages([r.document() for r in records])
+
+    def __sink(self, collection: str, write: Callable[[List[Dict]], Any]) -> Callable[[List[Dict]], Any]:
+        """
+        Destino das gravações de uma collection: o spool, quando ativo, ou
+        direto o banco.
+        """
+        if not self._spool:
+            return write
+
+        def _append(documents: List[Dict]) -> List[int]:
+            if documents:
+                self._spool.append(collection, documents)
+
+            return []
+
+        return _append
+
+    async def __save(self, collection: str, documents: List[Dict], write: Callable[[List[Dict]], Coroutine]) -> None:
+        """
+        Grava os documentos dos coletores no spool ou, sem ele, em segundo
+        plano no banco.
+        """
+        if self._spool:
+            if documents:
+                self._spool.append(collection, documents)
+        else:
+            await self._scheduler.write(write(documents))
 
-        while True:
-            for _c in psutil.net_connections():
-                if _c.laddr and _c.raddr and _c.pid:
-                    # Se endereço local e endereço remoto e tem PID
-                    # add no dicionário de conexões.
-                    _connections.append({
-                        'local_host': f'{_c.laddr.ip}:{_c.laddr.port}',
-                        'remote_host': f'{_c.raddr.ip}:{_c.raddr.port}',
-                        'pid': _c.pid,
-                        'status': _c.status,
-                    })
+    def collectors(self) -> None:
+        """
+        Roda os coletores periódicos em um único processo e event loop.
+        """
+        if CONF.collector_backend == 'procfs' and sys.platform.startswith('linux'):
+            self._net_io_counters = procfs.net_io_counters
+            self._net_connections = procfs.ConnectionTable().read
+        else:
+            if CONF.collector_backend != 'psutil':
+                _log.warning('Collector backend %s unavailable, using psutil', CONF.collector_backend)
+
+            self._net_io_counters = partial(psutil.net_io_counters, pernic=True)
+            self._net_connections = self.__psutil_connections
+
+        self._io, self._io_time = self._net_io_counters(), time.monotonic()
+        self._scheduler = Scheduler()
+        self._tracker = ConnectionTracker()
+        self._rollup = InterfaceRollup()
+        self._processes = ProcessCache()
+        self._scheduler.every(CONF.refresh_time, self.__interfaces)
+        self._scheduler.every(CONF.refresh_time, self.__connections)
+
+        if CONF.spool_enabled:
+            self._spool = Spool('collectors', self._model.insert_spooled)
+            self._spool.start()
+
+        if CONF.latest_buffer_size > 0:
+            self._ring = SampleRing.create()
+
+        try:
+            asyncio.run(self._scheduler.run())
+        finally:
+            if self._spool:
+                self._spool.stop()
 
-            await self._model.set_connections(_connections)
-            time.sleep(CONF.refresh_time)
-            _connections.clear()
+            if self._ring:
+                self._ring.close()
 
-    def __pkg_process(self, package: Any) -> None:
+    @staticmethod
+    def __all_interfaces() -> List[str]:
+        return CONF.capture_interfaces or [i for _, i in socket.if_nameindex()]
+
+    def capture_workers(self) -> int:
         """
-        Insere os pacotes da máquina em uma collection.
+        Quantidade de workers de captura. Sem fanout cada worker precisa de
+        ao menos uma interface.
         """
-        _pkg = {
-            'interface': package.name,
-            'source': package.src,
-            'destiny': package.dst,
-            'pkg_len': len(package),
-            'timestamp': package.time,
-        }
-        self._model.set_package(_pkg)
+        _workers = max(1, CONF.capture_workers)
+
+        if CONF.capture_fanout:
+            return _workers
 
-    # As funções a baixo são necessárias para rodar os daemons em processos separados.
-    # O multiprocessing do python não aceita funções assíncronas.
+        return min(_workers, len(self.__all_interfaces()))
 
-    def interfaces(self) -> None:
-        asyncio.run(self.__interfaces())
+    def __worker_interfaces(self, worker: int, workers: int) -> List[str]:
+        """
+        Interfaces capturadas pelo worker. Lista vazia captura todas.
+        """
+        if CONF.capture_fanout or workers == 1:
+            return CONF.capture_interfaces
 
-    def connections(self) -> None:
-        asyncio.run(self.__connections())
+        return self.__all_interfaces()[worker::workers]
 
-    def processes(self) -> None:
+    def processes(self, worker: int=0, workers: int=1) -> None:
         """
         Salva os dados dos processos do sistema.
+
+        Cada worker roda em seu próprio processo com o seu próprio writer.
+        Sem fanout as interfaces são divididas entre os workers, com fanout
+        todos capturam as mesmas interfaces e o kernel reparte os fluxos.
         """
+        _ifaces = self.__worker_interfaces(worker, workers)
+        # Todos os workers são filhos do mesmo processo, então compartilham
+        # o mesmo id de grupo.
+        _fanout = os.getppid() & 0xFFFF if CONF.capture_fanout else None
+        # Criado antes de qualquer thread, pois recusa configurações inválidas.
+        self._sampler = Sampler(lambda: self._writer.qsize())
+
+        # O writer é criado aqui, já dentro do processo filho, pois threads
+        # e clientes do Mongo não sobrevivem ao fork.
+        if CONF.spool_enabled:
+            # Com o spool, os contadores de gravados contam o que foi ao disco.
+            self._spool = Spool(f'capture-{worker}', self._model.insert_spooled)
+            self._spool.start()
+
+        self._set_packages = self.__sink('package', self._model.set_packages)
+        self._stats = CaptureStats(worker, self.__sink('capture_stats', self._model.set_capture_stats))
+
+        if CONF.capture_mode == 'flow':
+            self._writer = BatchWriter(self.__sink('flow', self._model.set_flows), stats=self._stats)
+            self._flows = FlowTable(self._writer.put)
+            self._flows.start()
+        else:
+            self._writer = BatchWriter(self.__pkg_flush, stats=self._stats)
+
+        if CONF.top_talkers:
+            self._top = TopTalkers(worker, self.__sink('top_talkers', self._model.set_top_talkers))
+            self._top.start()
+
+        if CONF.distinct_peers:
+            self._peers = DistinctPeers(worker, self.__sink('peer_sketch', self._model.set_peer_sketches))
+            self._peers.start()
+
+        self._writer.start()
+        _accept = self._sampler.accept
+        _log.info('Capture worker %s/%s on %s', worker + 1, workers, _ifaces or 'all interfaces')
+
         try:
-            sp.sniff(prn=self.__pkg_process, store=False)
+            if CONF.capture_engine == 'tpacket':
+                self._stats.start()
+                tpacket_sniff(self.__pkg_store, _ifaces, _accept, _fanout, self._stats)
+            else:
+                # Um socket por interface, cada um com o seu filtro BPF.
+                # O scapy só abre os sockets, a leitura não monta os pacotes.
+                _sockets = []
+
+                for k, i in enumerate(_ifaces or [None]):
+                    _s = sp.conf.L2listen(iface=i, filter=capture_filter(i))
+
+                    if _fanout is not None:
+                        join_fanout(_s.ins, _fanout + k)
+
+                    self._stats.watch(_s.ins, i)
+                    _sockets.append(_s.ins)
+
+                self._stats.start()
+                socket_sniff(self.__pkg_store, _sockets, _accept)
         except PermissionError:
             _log.warning('Operation not permited!')
         except Exception as e:
-            _log.error(e.args)
\ No newline at end of file
+            _log.error(e.args)
+        finally:
+            if self._flows:
+                self._flows.stop()
+
+            if self._top:
+                self._top.stop()
+
+            if self._peers:
+                self._peers.stop()
+
+            self._writer.stop()
+
+            if self._stats.running:
+                self._stats.stop()
+
+            if self._spool:
+                self._spool.stop()
@@ -0,0 +1,61 @@
+import logging
+import socket
+from typing import List, Tuple
+
+from pymongo.uri_parser import parse_uri
+
+from settings.config import CONF
+
+_log = logging.getLogger(__name__)
+_log.setLevel(CONF.log_level)
+
+
+def _database_nodes() -> List[Tuple[str, int]]:
+    """
+    Lista os (host, porta) do MongoDB configurado.
+    """
+    if CONF.db_host.startswith(('mongodb://', 'mongodb+srv://')):
+        try:
+            return parse_uri(CONF.db_host, default_port=CONF.db_port)['nodelist']
+        except Exception as e:
+            _log.warning('Could not parse the database uri: %s', e.args)
+            return []
+
+    return [(CONF.db_host, CONF.db_port)]
+
+
+def database_filter() -> str:
+    """
+    Expressão que descarta o tráfego entre o daemon e o MongoDB.
+    """
+    _exprs = []
+
+    for _host, _port in _database_nodes():
+        try:
+            # Resolve aqui para que um nome desconhecido não quebre a
+            # compilação do filtro inteiro.
+            _addrs = {i[4][0] for i in socket.getaddrinfo(_host, _port, proto=socket.IPPROTO_TCP)}
+        except OSError:
+            _log.warning('Could not resolve %s, excluding only port %s', _host, _port)
+            _exprs.append(f'not tcp port {_port}')
+            continue
+
+        for _addr in sorted(_addrs):
+            _exprs.append(f'not (host {_addr} and tcp port {_port})')
+
+    return ' and '.join(_exprs)
+
+
+def capture_filter(iface: str | None=None) -> str | None:
+    """
+    Monta o filtro BPF da interface, combinando o filtro global, o filtro
+    específico da interface e a exclusão do tráfego do banco.
+    """
+    _exprs = [
+        CONF.capture_filter,
+        CONF.capture_iface_filters.get(iface) if iface else None,
+        database_filter() if CONF.capture_exclude_db else None,
+    ]
+    _exprs = [f'({e})' for e in _exprs if e]
+
+    return ' and '.join(_exprs) or None
@@ -0,0 +1,242 @@
+import logging
+import mmap
+import select
+import socket
+import struct
+import time
+from typing import Any, Callable, Dict, List
+
+from scapy.arch.linux import attach_filter
+
+from core.daemons.bpf import capture_filter
+from core.daemons.decoder import PacketRecord, decode
+from settings.config import CONF
+
+_log = logging.getLogger(__name__)
+_log.setLevel(CONF.log_level)
+
+# Constantes de <linux/if_packet.h> e <linux/if_ether.h>.
+SOL_PACKET = 263
+PACKET_RX_RING = 5
+PACKET_STATISTICS = 6
+PACKET_VERSION = 10
+PACKET_FANOUT = 18
+PACKET_FANOUT_HASH = 0
+PACKET_FANOUT_FLAG_DEFRAG = 0x8000
+TPACKET_V3 = 2
+TP_STATUS_KERNEL = 0
+TP_STATUS_USER = 1
+ETH_P_ALL = 0x0003
+
+# struct tpacket_req3.
+_REQ3 = struct.Struct('=7I')
+# block_status, num_pkts, offset_to_first_pkt de struct tpacket_block_desc.
+_BLOCK = struct.Struct('=III')
+_BLOCK_STATUS_OFFSET = 8
+# tp_next_offset, tp_sec, tp_nsec, tp_snaplen, tp_len, tp_status, tp_mac, tp_net
+# de struct tpacket3_hdr.
+_HDR = struct.Struct('=6IHH')
+_NEXT = struct.Struct('=I')
+# sll_ifindex de struct sockaddr_ll, logo após o tpacket3_hdr alinhado (48 bytes).
+_SLL_IFINDEX = struct.Struct('=i')
+_SLL_IFINDEX_OFFSET = 48 + 4
+
+# Tipos de hardware (ARPHRD_ETHER, ARPHRD_LOOPBACK) que entregam o quadro Ethernet.
+_ETHERNET_HATYPES = (1, 772)
+_RECV_SIZE = 1 << 16
+
+Callback = Callable[[PacketRecord], None]
+
+
+def join_fanout(sock: socket.socket, group: int) -> None:
+    """
+    Coloca o socket em um grupo PACKET_FANOUT. O kernel distribui os pacotes
+    entre os sockets do grupo pelo hash do fluxo, então cada fluxo é sempre
+    entregue ao mesmo worker.
+    """
+    sock.setsockopt(
+        SOL_PACKET,
+        PACKET_FANOUT,
+        struct.pack('=I', (group & 0xFFFF) | ((PACKET_FANOUT_HASH | PACKET_FANOUT_FLAG_DEFRAG) << 16)),
+    )
+
+
+class TPacketRing:
+    """
+    Socket AF_PACKET com um anel TPACKET_V3 mapeado em memória.
+
+    O kernel entrega os quadros em blocos, então cada chamada de sistema
+    devolve vários pacotes sem nenhuma cópia para o espaço do usuário.
+    """
+    def __init__(
+            self,
+            iface: str | None=None,
+            fanout: int | None=None,
+            block_size: int=CONF.tpacket_block_size,
+            block_count: int=CONF.tpacket_block_count,
+            block_timeout: int=CONF.tpacket_block_timeout,
+        ) -> None:
+        self.iface = iface
+        self._block_size = block_size
+        self._block_count = block_count
+        self._block = 0
+        # Preso a uma interface, o socket nasce sem protocolo para não receber
+        # quadros de outras interfaces antes do bind.
+        self.sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, 0 if iface else socket.htons(ETH_P_ALL))
+        self._ring = None
+
+        try:
+            _bpf = capture_filter(iface)
+
+            if _bpf:
+                # O filtro roda no kernel e entra antes do anel, então o
+                # tráfego descartado nunca chega a ele.
+                try:
+                    attach_filter(self.sock, _bpf, iface)
+                except ImportError as e:
+                    _log.warning('Capture filter not attached: %s', e.args)
+
+            self.sock.setsockopt(SOL_PACKET, PACKET_VERSION, TPACKET_V3)
+            self.sock.setsockopt(SOL_PACKET, PACKET_RX_RING, _REQ3.pack(
+                block_size,
+                block_count,
+                # O tamanho de frame só é validado no V3, os pacotes são
+                # empacotados de forma variável dentro do bloco.
+                2048,
+                (block_size // 2048) * block_count,
+                block_timeout,
+                0,
+                0,
+            ))
+            self._ring = mmap.mmap(
+                self.sock.fileno(),
+                block_size * block_count,
+                mmap.MAP_SHARED,
+                mmap.PROT_READ | mmap.PROT_WRITE,
+            )
+
+            if iface:
+                self.sock.bind((iface, ETH_P_ALL))
+
+            if fanout is not None:
+                join_fanout(self.sock, fanout)
+        except Exception:
+            if self._ring is not None:
+                self._ring.close()
+
+            self.sock.close()
+            raise
+
+        self._view = memoryview(self._ring)
+
+    def fileno(self) -> int:
+        return self.sock.fileno()
+
+    def close(self) -> None:
+        self._view.release()
+        self._ring.close()
+        self.sock.close()
+
+    def read(self, callback: Callback, names: Dict[int, str], accept: Callable[[], bool]) -> int:
+        """
+        Consome os blocos liberados pelo kernel e devolve quantos foram lidos.
+        """
+        _read = 0
+
+        while True:
+            _offset = self._block * self._block_size
+            _status, _count, _pkt = _BLOCK.unpack_from(self._view, _offset + _BLOCK_STATUS_OFFSET)
+
+            if not _status & TP_STATUS_USER:
+                return _read
+
+            _pkt += _offset
+
+            for _ in range(_count):
+                if accept():
+                    _pkt += self.__frame(_pkt, callback, names)
+                else:
+                    _pkt += _NEXT.unpack_from(self._view, _pkt)[0]
+
+            # Devolve o bloco para o kernel.
+            struct.pack_into('=I', self._view, _offset + _BLOCK_STATUS_OFFSET, TP_STATUS_KERNEL)
+            self._block = (self._block + 1) % self._block_count
+            _read += 1
+
+    def __frame(self, offset: int, callback: Callback, names: Dict[int, str]) -> int:
+        """
+        Extrai os campos de um quadro e devolve o deslocamento até o próximo.
+        """
+        _next, _sec, _nsec, _snaplen, _len, _, _mac_off, _net_off = _HDR.unpack_from(self._view, offset)
+        _ifindex, = _SLL_IFINDEX.unpack_from(self._view, offset + _SLL_IFINDEX_OFFSET)
+
+        _name = names.get(_ifindex)
+
+        if _name is None:
+            try:
+                _name = names[_ifindex] = socket.if_indextoname(_ifindex)
+            except OSError:
+                _name = str(_ifindex)
+
+        _frame = self._view[offset + _mac_off:offset + _mac_off + _snaplen]
+        # Interfaces sem camada de enlace (tun, ppp) começam no IP.
+        _record = decode(_frame, _name, _len, _sec + _nsec / 1e9, _net_off > _mac_off)
+        _frame.release()
+        callback(_record)
+        return _next
+
+
+def tpacket_sniff(
+        callback: Callback,
+        ifaces: List[str]=[],
+        accept: Callable[[], bool]=lambda: True,
+        fanout: int | None=None,
+        stats: Any=None,
+    ) -> None:
+    """
+    Captura pacotes pelos anéis TPACKET_V3 das interfaces informadas, ou de
+    todas as interfaces quando nenhuma for informada. Os quadros recusados
+    por `accept` são pulados antes de qualquer decodificação. Com `fanout`,
+    o anel de cada interface entra no grupo `fanout + índice da interface`.
+    """
+    _rings = []
+    _names = {}
+    _poll = select.poll()
+
+    try:
+        # Se um anel falhar, os já criados são fechados no finally.
+        for k, i in enumerate(ifaces or [None]):
+            _r = TPacketRing(i, None if fanout is None else fanout + k)
+            _rings.append(_r)
+            _poll.register(_r, select.POLLIN | select.POLLERR)
+
+            if stats:
+                stats.watch(_r.sock, _r.iface)
+
+        while True:
+            for _r in _rings:
+                _r.read(callback, _names, accept)
+
+            _poll.poll(CONF.tpacket_block_timeout)
+    finally:
+        for _r in _rings:
+            _r.close()
+
+
+def socket_sniff(
+        callback: Callback,
+        sockets: List[socket.socket],
+        accept: Callable[[], bool]=lambda: True,
+    ) -> None:
+    """
+    Captura pacotes lendo os bytes direto de sockets AF_PACKET comuns, sem
+    montar objetos do scapy. É o caminho usado pelo motor scapy.
+    """
+    while True:
+        for _s in select.select(sockets, [], [], 1)[0]:
+            _raw, _sll = _s.recvfrom(_RECV_SIZE)
+
+            if not accept():
+                continue
+
+            callback(decode(memoryview(_raw), _sll[0], len(_raw), time.time(), _sll[3] in _ETHERNET_HATYPES))
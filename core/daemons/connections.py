@@ -0,0 +1,97 @@
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+
+from settings.config import CONF
+
+_log = logging.getLogger(__name__)
+_log.setLevel(CONF.log_level)
+
+
+def connection_key(connection: Dict) -> Tuple[str, str, int]:
+    """
+    Chave única de uma conexão, a mesma do índice da collection.
+    """
+    return connection['local_host'], connection['remote_host'], connection['pid']
+
+
+class ConnectionTracker:
+    """
+    Compara cada leitura das conexões com a anterior, mantida em memória.
+
+    Só as diferenças viram eventos: "opened" para conexões novas, "closed"
+    para as que sumiram e "changed" quando o status muda. A cada
+    `checkpoint` segundos todas as conexões abertas também são emitidas,
+    com o evento "checkpoint", para que o estado possa ser reconstruído a
+    partir do último checkpoint e dos eventos seguintes.
+
+    Independente dos checkpoints, todas as conexões abertas voltam para o
+    estado atual a cada metade de `expire`, renovando o `last_seen` antes
+    que elas expirem.
+
+    A linha de comando do processo, que pode ser longa, só vai no evento
+    "opened" e no estado atual, não se repete nos demais eventos.
+    """
+    _opened_only = ('cmdline',)
+
+    def __init__(
+            self,
+            checkpoint: int=CONF.connection_checkpoint,
+            expire: int=CONF.connection_expire_time,
+        ) -> None:
+        self._checkpoint = checkpoint
+        self._next_checkpoint = 0
+        self._refresh = max(1, expire / 2)
+        self._next_refresh = 0
+        self._connections: Dict[Tuple[str, str, int], Dict] = {}
+
+    def diff(self, connections: List[Dict]) -> Tuple[List[Dict], List[Dict], List[Dict]]:
+        """
+        Devolve os eventos da leitura, as conexões que precisam ser gravadas
+        no estado atual (novas, com status alterado ou, no checkpoint,
+        todas) e as que fecharam.
+        """
+        _now = time.time()
+        _date = datetime.fromtimestamp(_now, timezone.utc)
+        _current = {connection_key(c): c for c in connections}
+        _events = []
+        _changed = []
+        _closed = []
+
+        def _event(name: str, connection: Dict, **extra) -> None:
+            if name != 'opened':
+                connection = {k: v for k, v in connection.items() if k not in self._opened_only}
+
+            _events.append(dict(connection, event=name, timestamp=_now, date=_date, **extra))
+
+        for _key, _c in _current.items():
+            _last = self._connections.get(_key)
+
+            if _last is None:
+                _changed.append(_c)
+                _event('opened', _c)
+            elif _last['status'] != _c['status']:
+                _changed.append(_c)
+                _event('changed', _c, previous_status=_last['status'])
+
+        for _key, _c in self._connections.items():
+            if _key not in _current:
+                _closed.append(_c)
+                _event('closed', _c)
+
+        self._connections = _current
+
+        _checkpoint = self._checkpoint > 0 and _now >= self._next_checkpoint
+
+        if _checkpoint or _now >= self._next_refresh:
+            self._next_refresh = _now + self._refresh
+            _changed = list(_current.values())
+
+        if _checkpoint:
+            self._next_checkpoint = _now + self._checkpoint
+
+            for _c in _changed:
+                _event('checkpoint', _c)
+
+        return _events, _changed, _closed
@@ -0,0 +1,116 @@
+import socket
+import struct
+from datetime import datetime, timezone
+from typing import Dict
+
+ETH_P_IP = 0x0800
+ETH_P_IPV6 = 0x86DD
+# Tags de VLAN 802.1Q e 802.1ad.
+_VLAN_TAGS = (0x8100, 0x88A8)
+# Protocolos de transporte que começam com as portas de origem e destino.
+_PORT_PROTOCOLS = (6, 17, 132)
+
+_ETHERTYPE = struct.Struct('!H')
+_PORTS = struct.Struct('!HH')
+
+
+def _mac(raw: memoryview) -> str:
+    return '%02x:%02x:%02x:%02x:%02x:%02x' % tuple(raw)
+
+
+class PacketRecord:
+    """
+    Registro compacto de um pacote, mantido até a gravação do lote.
+    """
+    __slots__ = (
+        'interface',
+        'source',
+        'destiny',
+        'src_ip',
+        'dst_ip',
+        'protocol',
+        'sport',
+        'dport',
+        'length',
+        'timestamp',
+        'sampling_rate',
+    )
+
+    def __init__(self, interface: str, length: int, timestamp: float) -> None:
+        self.interface = interface
+        self.length = length
+        self.timestamp = timestamp
+        self.source = self.destiny = self.src_ip = self.dst_ip = None
+        self.protocol = self.sport = self.dport = None
+        self.sampling_rate = 1
+
+    def document(self) -> Dict:
+        return {
+            'interface': self.interface,
+            'source': self.source,
+            'destiny': self.destiny,
+            'src_ip': self.src_ip,
+            'dst_ip': self.dst_ip,
+            'protocol': self.protocol,
+            'sport': self.sport,
+            'dport': self.dport,
+            'pkg_len': self.length,
+            'timestamp': self.timestamp,
+            'date': datetime.fromtimestamp(self.timestamp, timezone.utc),
+            'sampling_rate': self.sampling_rate,
+        }
+
+
+def decode(frame: memoryview, interface: str, length: int, timestamp: float, l2: bool=True) -> PacketRecord:
+    """
+    Decodifica só os cabeçalhos Ethernet, IP e TCP/UDP direto dos bytes do
+    quadro. `source` e `destiny` seguem o endereço de enlace, como no scapy,
+    e caem para o endereço IP em interfaces sem camada de enlace.
+    """
+    _r = PacketRecord(interface, length, timestamp)
+    _size = len(frame)
+    _net = 0
+
+    if l2:
+        if _size < 14:
+            return _r
+
+        _r.destiny, _r.source = _mac(frame[0:6]), _mac(frame[6:12])
+        _type, = _ETHERTYPE.unpack_from(frame, 12)
+        _net = 14
+
+        while _type in _VLAN_TAGS and _size >= _net + 4:
+            _type, = _ETHERTYPE.unpack_from(frame, _net + 2)
+            _net += 4
+
+        if _type not in (ETH_P_IP, ETH_P_IPV6):
+            return _r
+
+    if _size < _net + 20:
+        return _r
+
+    _version = frame[_net] >> 4
+
+    if _version == 4:
+        _r.src_ip = socket.inet_ntoa(frame[_net + 12:_net + 16])
+        _r.dst_ip = socket.inet_ntoa(frame[_net + 16:_net + 20])
+        _r.protocol = frame[_net + 9]
+        # Só o primeiro fragmento traz as portas.
+        _first = not (frame[_net + 6] & 0x1F or frame[_net + 7])
+        _l4 = _net + (frame[_net] & 0x0F) * 4
+    elif _version == 6 and _size >= _net + 40:
+        _r.src_ip = socket.inet_ntop(socket.AF_INET6, frame[_net + 8:_net + 24])
+        _r.dst_ip = socket.inet_ntop(socket.AF_INET6, frame[_net + 24:_net + 40])
+        _r.protocol = frame[_net + 6]
+        _first = True
+        _l4 = _net + 40
+    else:
+        return _r
+
+    if not l2:
+        _r.source, _r.destiny = _r.src_ip, _r.dst_ip
+
+    if _first and _r.protocol in _PORT_PROTOCOLS and _size >= _l4 + 4:
+        _r.sport, _r.dport = _PORTS.unpack_from(frame, _l4)
+
+    return _r
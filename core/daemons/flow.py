@@ -0,0 +1,70 @@
+import logging
+from datetime import datetime, timezone
+from typing import Callable, Dict
+
+from core.daemons.decoder import PacketRecord
+from core.daemons.window import Windowed
+from settings.config import CONF
+
+_log = logging.getLogger(__name__)
+_log.setLevel(CONF.log_level)
+
+
+class FlowTable(Windowed):
+    """
+    Agrega os pacotes em fluxos por janela de tempo.
+
+    Um fluxo é identificado por (interface, origem, destino, protocolo,
+    porta de origem, porta de destino) e, ao fim de cada janela, vira um
+    único registro com a contagem de pacotes e bytes e o primeiro e último
+    pacote visto. Com amostragem, pacotes e bytes já são gravados escalados
+    pela taxa, e `sampled` guarda quantos pacotes foram de fato vistos.
+    """
+    def __init__(self, emit: Callable[[Dict], None], window: int=CONF.flow_window) -> None:
+        super().__init__(window)
+        self._emit = emit
+        self._flows = {}
+
+    def add(self, record: PacketRecord) -> None:
+        _key = (record.interface, record.source, record.destiny, record.protocol, record.sport, record.dport)
+        _rate = record.sampling_rate
+
+        with self._lock:
+            _flow = self._flows.get(_key)
+
+            if _flow is None:
+                self._flows[_key] = [_rate, record.length * _rate, record.timestamp, record.timestamp, 1]
+            else:
+                _flow[0] += _rate
+                _flow[1] += record.length * _rate
+                _flow[4] += 1
+
+                if record.timestamp > _flow[3]:
+                    _flow[3] = record.timestamp
+
+    def flush(self, start: float) -> None:
+        """
+        Emite os fluxos da janela iniciada em `start` e abre uma nova.
+        """
+        with self._lock:
+            _flows, self._flows = self._flows, {}
+
+        _window = datetime.fromtimestamp(start, timezone.utc)
+
+        for (_if, _src, _dst, _proto, _sport, _dport), _f in _flows.items():
+            self._emit({
+                'interface': _if,
+                'source': _src,
+                'destiny': _dst,
+                'protocol': _proto,
+                'sport': _sport,
+                'dport': _dport,
+                'packets': _f[0],
+                'bytes': _f[1],
+                'first_seen': _f[2],
+                'last_seen': _f[3],
+                'sampled': _f[4],
+                'sampling_rate': _f[0] / _f[4],
+                'timestamp': start,
+                'window': _window,
+            })
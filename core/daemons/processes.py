@@ -0,0 +1,64 @@
+import logging
+from collections import OrderedDict
+from typing import Dict, Iterable, Tuple
+
+import psutil
+
+from settings.config import CONF
+
+_log = logging.getLogger(__name__)
+_log.setLevel(CONF.log_level)
+
+
+class ProcessCache:
+    """
+    Cache LRU dos dados dos processos, chaveado pelo PID.
+
+    A cada leitura só o create_time de cada PID é consultado. Se o PID foi
+    reutilizado por outro processo o create_time muda e os dados são lidos
+    de novo. Processos que acabaram saem do cache quando consultados, e os
+    que não são mais consultados saem pelo limite de tamanho.
+    """
+    attrs = ['name', 'exe', 'username', 'cmdline']
+
+    def __init__(self, capacity: int=CONF.process_cache_size) -> None:
+        self._capacity = max(1, capacity)
+        self._cache: OrderedDict[int, Tuple[float, Dict]] = OrderedDict()
+
+    def lookup(self, pids: Iterable[int]) -> Dict[int, Dict]:
+        """
+        Devolve os dados de cada PID que ainda existe.
+        """
+        _found = {}
+
+        for _pid in set(pids):
+            try:
+                _p = psutil.Process(_pid)
+                _created = _p.create_time()
+            except psutil.NoSuchProcess:
+                self._cache.pop(_pid, None)
+                continue
+            except psutil.Error:
+                continue
+
+            _entry = self._cache.get(_pid)
+
+            if _entry is None or _entry[0] != _created:
+                try:
+                    _info = _p.as_dict(attrs=self.attrs, ad_value=None)
+                except psutil.NoSuchProcess:
+                    self._cache.pop(_pid, None)
+                    continue
+
+                _info['cmdline'] = ' '.join(_info['cmdline'] or [])
+                self._cache[_pid] = (_created, _info)
+
+                if len(self._cache) > self._capacity:
+                    self._cache.popitem(last=False)
+            else:
+                _info = _entry[1]
+
+            self._cache.move_to_end(_pid)
+            _found[_pid] = _info
+
+        return _found
@@ -0,0 +1,187 @@
+import logging
+import os
+import socket
+import struct
+import time
+from typing import Dict, List, NamedTuple
+
+from settings.config import CONF
+
+_log = logging.getLogger(__name__)
+_log.setLevel(CONF.log_level)
+
+# Estados do TCP em /proc/net/tcp, com os nomes usados pelo psutil.
+_TCP_STATES = {
+    '01': 'ESTABLISHED',
+    '02': 'SYN_SENT',
+    '03': 'SYN_RECV',
+    '04': 'FIN_WAIT1',
+    '05': 'FIN_WAIT2',
+    '06': 'TIME_WAIT',
+    '07': 'CLOSE',
+    '08': 'CLOSE_WAIT',
+    '09': 'LAST_ACK',
+    '0A': 'LISTEN',
+    '0B': 'CLOSING',
+    '0C': 'SYN_RECV',
+}
+_TABLES = (
+    ('tcp', socket.AF_INET),
+    ('tcp6', socket.AF_INET6),
+    ('udp', socket.AF_INET),
+    ('udp6', socket.AF_INET6),
+)
+
+
+class IOCounters(NamedTuple):
+    bytes_sent: int
+    bytes_recv: int
+
+
+def net_io_counters() -> Dict[str, IOCounters]:
+    """
+    Bytes enviados e recebidos por interface, lidos de /proc/net/dev.
+    """
+    _counters = {}
+
+    with open('/proc/net/dev') as f:
+        # As duas primeiras linhas são o cabeçalho.
+        for _line in f.readlines()[2:]:
+            _iface, _data = _line.split(':', 1)
+            _fields = _data.split()
+            _counters[_iface.strip()] = IOCounters(int(_fields[8]), int(_fields[0]))
+
+    return _counters
+
+
+def _address(raw: str, family: int) -> str:
+    """
+    Converte o endereço hexadecimal do /proc, em palavras de 32 bits na
+    ordem do host, para texto.
+    """
+    _ip, _port = raw.split(':')
+    _packed = bytes.fromhex(_ip)
+    _packed = b''.join(
+        struct.pack('=I', int.from_bytes(_packed[i:i + 4], 'big'))
+        for i in range(0, len(_packed), 4)
+    )
+
+    return f'{socket.inet_ntop(family, _packed)}:{int(_port, 16)}'
+
+
+class InodeMap:
+    """
+    Mapa do inode de cada socket para o PID dono.
+
+    Ler o /proc/<pid>/fd de todos os processos é a parte cara, então o mapa
+    completo só é refeito a cada `refresh` segundos. Entre uma reconstrução
+    e outra, inodes desconhecidos fazem os processos novos serem lidos e,
+    se não bastar, o mapa ser refeito, no máximo a cada `_retry` segundos.
+    Inodes que nem a reconstrução resolve, de processos sem permissão de
+    leitura ou já fechados, não provocam novas leituras até a próxima.
+    """
+    _retry = 5  # Segundos mínimos entre reconstruções por inodes desconhecidos.
+
+    def __init__(self, refresh: int=CONF.proc_inode_refresh) -> None:
+        self._refresh = refresh
+        self._next = 0
+        self._rebuilt = 0
+        self._pids = set()
+        self._inodes: Dict[str, int] = {}
+        self._unknown = set()
+
+    def resolve(self, inodes: List[str]) -> Dict[str, int]:
+        _now = time.monotonic()
+
+        if _now >= self._next:
+            self.__rebuild(inodes)
+        elif self.__missing(inodes):
+            _pids = self.__all_pids()
+            # Processos que acabaram levam os seus sockets junto.
+            self._pids &= _pids
+            self.__scan(_pids - self._pids)
+
+            # Processos antigos também abrem sockets novos.
+            if self.__missing(inodes) and _now >= self._rebuilt + self._retry:
+                self.__rebuild(inodes)
+
+        return self._inodes
+
+    def __missing(self, inodes: List[str]) -> List[str]:
+        # Sockets em TIME_WAIT não têm mais inode, nem dono.
+        return [i for i in inodes if i != '0' and i not in self._inodes and i not in self._unknown]
+
+    def __rebuild(self, inodes: List[str]) -> None:
+        self._rebuilt = time.monotonic()
+        self._next = self._rebuilt + self._refresh
+        self._pids, self._inodes, self._unknown = set(), {}, set()
+        self.__scan(self.__all_pids())
+        self._unknown = set(self.__missing(inodes))
+
+    @staticmethod
+    def __all_pids() -> set:
+        return {int(p) for p in os.listdir('/proc') if p.isdigit()}
+
+    def __scan(self, pids: set) -> None:
+        for _pid in pids:
+            _fd = f'/proc/{_pid}/fd'
+            # Mesmo sem permissão, não tenta de novo até a reconstrução.
+            self._pids.add(_pid)
+
+            try:
+                _fds = os.listdir(_fd)
+            except OSError:
+                continue
+
+            for _f in _fds:
+                try:
+                    _link = os.readlink(f'{_fd}/{_f}')
+                except OSError:
+                    # Descritor fechado durante a leitura.
+                    continue
+
+                if _link.startswith('socket:['):
+                    self._inodes[_link[8:-1]] = _pid
+
+
+class ConnectionTable:
+    """
+    Conexões lidas de /proc/net/{tcp,tcp6,udp,udp6}, no mesmo formato do
+    coletor baseado no psutil.
+    """
+    def __init__(self) -> None:
+        self._inodes = InodeMap()
+
+    def read(self) -> List[Dict]:
+        _sockets = []
+
+        for _name, _family in _TABLES:
+            try:
+                with open(f'/proc/net/{_name}') as f:
+                    _lines = f.readlines()[1:]
+            except OSError:
+                continue
+
+            for _line in _lines:
+                _fields = _line.split()
+                _remote = _fields[2]
+
+                # Sem endereço remoto, como o psutil, não é uma conexão.
+                if _remote.endswith(':0000'):
+                    continue
+
+                _sockets.append((
+                    _address(_fields[1], _family),
+                    _address(_remote, _family),
+                    _TCP_STATES.get(_fields[3], 'NONE') if _name.startswith('tcp') else 'NONE',
+                    _fields[9],
+                ))
+
+        _owners = self._inodes.resolve([s[3] for s in _sockets])
+
+        return [{
+            'local_host': _local,
+            'remote_host': _remote,
+            'pid': _owners[_inode],
+            'status': _status,
+        } for _local, _remote, _status, _inode in _sockets if _inode in _owners]
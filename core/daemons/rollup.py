@@ -0,0 +1,79 @@
+import logging
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+
+from settings.config import CONF
+
+_log = logging.getLogger(__name__)
+_log.setLevel(CONF.log_level)
+
+
+def percentile(values: List[float], p: float) -> float:
+    """
+    Percentil pelo método nearest-rank.
+    """
+    _sorted = sorted(values)
+    return _sorted[max(0, math.ceil(p / 100 * len(_sorted)) - 1)]
+
+
+class InterfaceRollup:
+    """
+    Agrega as amostras das interfaces em faixas de tempo de vários tamanhos.
+
+    Para cada faixa (tier) e interface é mantido o bucket aberto, alinhado
+    ao relógio, com os valores de cada métrica. Quando chega uma amostra de
+    um bucket seguinte, o aberto é fechado e vira um documento com mínimo,
+    máximo, média e p95 de cada métrica. Cada tier tem a sua retenção,
+    gravada no campo `expire` do documento.
+    """
+    metrics = ('upload_speed', 'download_speed', 'upload_bytes', 'download_bytes')
+
+    def __init__(self, tiers: Dict[int, int]=CONF.rollup_tiers) -> None:
+        self._tiers = tiers
+        self._buckets: Dict[Tuple[int, str], Tuple[float, Dict[str, List[float]]]] = {}
+
+    def add(self, sample: Dict) -> List[Dict]:
+        """
+        Acrescenta uma amostra e devolve os buckets que ela fechou.
+        """
+        _closed = []
+
+        for _tier in self._tiers:
+            _key = (_tier, sample['interface'])
+            _start = sample['timestamp'] // _tier * _tier
+            _bucket = self._buckets.get(_key)
+
+            if _bucket is not None and _bucket[0] != _start:
+                _closed.append(self.__document(_key, *_bucket))
+                _bucket = None
+
+            if _bucket is None:
+                _bucket = self._buckets[_key] = (_start, {m: [] for m in self.metrics})
+
+            for _m in self.metrics:
+                _bucket[1][_m].append(sample[_m])
+
+        return _closed
+
+    def __document(self, key: Tuple[int, str], start: float, values: Dict[str, List[float]]) -> Dict:
+        _tier, _iface = key
+        _window = datetime.fromtimestamp(start, timezone.utc)
+        _doc = {
+            'interface': _iface,
+            'tier': _tier,
+            'samples': len(values[self.metrics[0]]),
+            'timestamp': start,
+            'window': _window,
+            'expire': _window + timedelta(seconds=self._tiers[_tier]),
+        }
+
+        for _m, _v in values.items():
+            _doc[_m] = {
+                'min': min(_v),
+                'max': max(_v),
+                'avg': sum(_v) / len(_v),
+                'p95': percentile(_v, 95),
+            }
+
+        return _doc
@@ -0,0 +1,79 @@
+import logging
+import time
+from typing import Callable
+
+from settings.config import CONF
+
+_log = logging.getLogger(__name__)
+_log.setLevel(CONF.log_level)
+
+
+class Sampler:
+    """
+    Amostragem 1 a cada N pacotes.
+
+    No modo "fixed" N é fixo. No modo "adaptive" N dobra enquanto a fila de
+    processamento estiver acima da marca alta e cai pela metade quando ela
+    volta para baixo da marca baixa, limitando o custo de CPU em rajadas.
+    O modo adaptativo só vale para a captura crua: no modo de fluxo os
+    pacotes são agregados na própria thread de captura e nunca chegam à
+    fila, então não haveria carga para medir.
+    """
+    _interval = 1  # Segundos entre ajustes do modo adaptativo.
+
+    def __init__(
+            self,
+            depth: Callable[[], int],
+            mode: str=CONF.sampling_mode,
+            rate: int=CONF.sampling_rate,
+            max_rate: int=CONF.sampling_max_rate,
+            capacity: int=CONF.pkg_queue_size,
+            capture_mode: str=CONF.capture_mode,
+        ) -> None:
+        if mode == 'adaptive' and capture_mode == 'flow':
+            raise ValueError('Adaptive sampling needs captureMode raw, use fixed sampling with flows')
+
+        self._depth = depth
+        self._adaptive = mode == 'adaptive'
+        self.rate = max(1, rate) if mode in ('fixed', 'adaptive') else 1
+        self._max_rate = max(1, max_rate)
+        self._high = capacity * CONF.sampling_high_water
+        self._low = capacity * CONF.sampling_low_water
+        # Taxa com que o último pacote aceito foi amostrado.
+        self.weight = self.rate
+        self._count = 0
+        self._next_adjust = 0
+
+    def accept(self) -> bool:
+        """
+        Diz se o pacote atual deve ser processado.
+        """
+        self._count += 1
+
+        if self._count < self.rate:
+            return False
+
+        self._count = 0
+        # O ajuste só vale para os próximos pacotes.
+        self.weight = self.rate
+
+        if self._adaptive:
+            self.__adjust()
+
+        return True
+
+    def __adjust(self) -> None:
+        _now = time.monotonic()
+
+        if _now < self._next_adjust:
+            return
+
+        self._next_adjust = _now + self._interval
+        _depth = self._depth()
+
+        if _depth > self._high and self.rate < self._max_rate:
+            self.rate = min(self.rate * 2, self._max_rate)
+            _log.warning('Queue depth %s, sampling 1 in %s packets', _depth, self.rate)
+        elif _depth < self._low and self.rate > 1:
+            self.rate //= 2
+            _log.info('Queue depth %s, sampling 1 in %s packets', _depth, self.rate)
@@ -0,0 +1,93 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Coroutine, List, Tuple
+
+from settings.config import CONF
+
+_log = logging.getLogger(__name__)
+_log.setLevel(CONF.log_level)
+
+
+class Scheduler:
+    """
+    Roda os coletores como tarefas de um único event loop.
+
+    Cada coletor tem o seu horário calculado no relógio monotônico a partir
+    do início, então o tempo gasto em um ciclo não atrasa os próximos. Um
+    ciclo que estoura o intervalo pula os horários perdidos em vez de rodar
+    atrasado. As gravações rodam em segundo plano, sobrepostas à coleta do
+    ciclo seguinte.
+    """
+    def __init__(self, max_pending: int=CONF.collector_max_pending) -> None:
+        self._jobs: List[Tuple[float, Callable[[], Awaitable[None]]]] = []
+        self._pending = set()
+        self._max_pending = max(1, max_pending)
+        self._last_ordered: asyncio.Task | None = None
+
+    def every(self, interval: float, job: Callable[[], Awaitable[None]]) -> None:
+        self._jobs.append((interval, job))
+
+    async def run(self) -> None:
+        await asyncio.gather(*(self.__loop(i, j) for i, j in self._jobs))
+
+    async def write(self, coro: Coroutine, ordered: bool=False) -> None:
+        """
+        Agenda uma gravação sem esperar por ela. Se o banco estiver lento e
+        as gravações pendentes passarem do limite, espera a mais antiga.
+
+        As gravações `ordered` rodam uma de cada vez, na ordem em que foram
+        agendadas, para as que dependem da anterior já estar no banco.
+        """
+        while len(self._pending) >= self._max_pending:
+            await asyncio.wait(self._pending, return_when=asyncio.FIRST_COMPLETED)
+
+        if ordered:
+            coro = self.__after(self._last_ordered, coro)
+
+        _task = asyncio.create_task(coro)
+        self._pending.add(_task)
+        _task.add_done_callback(self.__done)
+
+        if ordered:
+            self._last_ordered = _task
+
+    @staticmethod
+    async def __after(previous: asyncio.Task | None, coro: Coroutine) -> None:
+        if previous is not None:
+            # Só espera: o erro da anterior já é registrado no __done.
+            await asyncio.wait([previous])
+
+        await coro
+
+    @staticmethod
+    async def blocking(func: Callable, *args: Any) -> Any:
+        """
+        Roda uma chamada bloqueante no executor padrão.
+        """
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    def __done(self, task: asyncio.Task) -> None:
+        self._pending.discard(task)
+
+        if not task.cancelled() and task.exception():
+            _log.error(task.exception().args)
+
+    async def __loop(self, interval: float, job: Callable[[], Awaitable[None]]) -> None:
+        _loop = asyncio.get_running_loop()
+        _next = _loop.time()
+
+        while True:
+            try:
+                await job()
+            except Exception as e:
+                _log.error(e.args)
+
+            _next += interval
+            _now = _loop.time()
+
+            if _now >= _next:
+                _missed = int((_now - _next) // interval) + 1
+                _log.warning('%s overran its interval, skipping %s tick(s)', job.__name__, _missed)
+                _next += _missed * interval
+
+            await asyncio.sleep(_next - _now)
@@ -0,0 +1,152 @@
+import logging
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List
+
+from core.daemons.decoder import PacketRecord
+from core.daemons.window import Windowed
+from core.utils.sketch import HyperLogLog, SpaceSaving
+from settings.config import CONF
+
+_log = logging.getLogger(__name__)
+_log.setLevel(CONF.log_level)
+
+
+class DistinctPeers(Windowed):
+    """
+    HyperLogLog das origens e destinos distintos por interface e janela.
+
+    Ao fim de cada janela os sketches são gravados comprimidos, um documento
+    por interface e sentido, e as consultas combinam as janelas do período.
+    """
+    kinds = ('source', 'destiny')
+
+    def __init__(
+            self,
+            worker: int,
+            emit: Callable[[List[Dict]], Any],
+            window: int=CONF.distinct_bucket,
+            precision: int=CONF.hll_precision,
+        ) -> None:
+        super().__init__(window)
+        self._worker = worker
+        self._emit = emit
+        self._precision = precision
+        self._sketches = {}
+
+    def add(self, record: PacketRecord) -> None:
+        _src = record.src_ip or record.source
+        _dst = record.dst_ip or record.destiny
+
+        with self._lock:
+            _s = self._sketches.get(record.interface)
+
+            if _s is None:
+                _s = self._sketches[record.interface] = (
+                    HyperLogLog(self._precision),
+                    HyperLogLog(self._precision),
+                )
+
+            if _src:
+                _s[0].add(_src)
+
+            if _dst:
+                _s[1].add(_dst)
+
+    def flush(self, start: float) -> None:
+        with self._lock:
+            _sketches, self._sketches = self._sketches, {}
+
+        _window = datetime.fromtimestamp(start, timezone.utc)
+        _docs = [{
+            'worker': self._worker,
+            'interface': _iface,
+            'kind': _kind,
+            'precision': self._precision,
+            'registers': _hll.to_bytes(),
+            'timestamp': start,
+            'window': _window,
+        } for _iface, _pair in _sketches.items() for _kind, _hll in zip(self.kinds, _pair)]
+
+        if _docs:
+            self._emit(_docs)
+
+
+class TopTalkers(Windowed):
+    """
+    Maiores origens, destinos e pares, em bytes e em pacotes, por janela.
+
+    Os endereços são os IPs quando o pacote tem camada de rede e os de
+    enlace nos demais casos. Ao fim de cada janela os sketches viram um
+    documento por dimensão e métrica, e as consultas somam as janelas.
+    """
+    dimensions = ('source', 'destiny', 'pair')
+    metrics = ('bytes', 'packets')
+
+    def __init__(
+            self,
+            worker: int,
+            emit: Callable[[List[Dict]], Any],
+            window: int=CONF.top_window,
+            capacity: int=CONF.top_capacity,
+        ) -> None:
+        super().__init__(window)
+        self._worker = worker
+        self._emit = emit
+        self._capacity = capacity
+        self._sketches = self.__new()
+
+    def __new(self) -> Dict[tuple, SpaceSaving]:
+        return {
+            (d, m): SpaceSaving(self._capacity)
+            for d in self.dimensions for m in self.metrics
+        }
+
+    def add(self, record: PacketRecord) -> None:
+        _src = record.src_ip or record.source
+        _dst = record.dst_ip or record.destiny
+        _bytes = record.length * record.sampling_rate
+        _packets = record.sampling_rate
+
+        with self._lock:
+            _s = self._sketches
+
+            if _src:
+                _s['source', 'bytes'].add(_src, _bytes)
+                _s['source', 'packets'].add(_src, _packets)
+
+            if _dst:
+                _s['destiny', 'bytes'].add(_dst, _bytes)
+                _s['destiny', 'packets'].add(_dst, _packets)
+
+            if _src and _dst:
+                _s['pair', 'bytes'].add((_src, _dst), _bytes)
+                _s['pair', 'packets'].add((_src, _dst), _packets)
+
+    def flush(self, start: float) -> None:
+        with self._lock:
+            _sketches, self._sketches = self._sketches, self.__new()
+
+        _window = datetime.fromtimestamp(start, timezone.utc)
+        _docs = []
+
+        for (_dimension, _metric), _sketch in _sketches.items():
+            _items = _sketch.top()
+
+            if not _items:
+                continue
+
+            _docs.append({
+                'worker': self._worker,
+                'dimension': _dimension,
+                'metric': _metric,
+                'items': [
+                    {'key': list(i) if isinstance(i, tuple) else i, 'value': v, 'error': e}
+                    for i, v, e in _items
+                ],
+                'minimum': _sketch.minimum,
+                'timestamp': start,
+                'window': _window,
+            })
+
+        if _docs:
+            self._emit(_docs)
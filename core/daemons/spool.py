@@ -0,0 +1,206 @@
+import logging
+import os
+import struct
+import threading
+import zlib
+from itertools import groupby
+from typing import Callable, Dict, List, Tuple
+
+import bson
+from bson import ObjectId
+
+from settings.config import CONF
+
+_log = logging.getLogger(__name__)
+_log.setLevel(CONF.log_level)
+
+# Tamanho e crc32 do registro, seguidos do documento em BSON.
+_HEADER = struct.Struct('=II')
+# Segmento e deslocamento do próximo registro a ser gravado no banco.
+_POSITION = struct.Struct('=QQ')
+
+
+class Spool:
+    """
+    Buffer em disco, só de acréscimo, entre os daemons e o banco.
+
+    Os documentos são gravados em segmentos numerados, um registro por
+    documento, e uma thread os lê na ordem e os grava no banco em lotes
+    grandes. Se o banco falhar o lote é tentado de novo e os registros
+    continuam no disco, inclusive entre reinícios, já que a posição de
+    leitura também é salva. Segmentos lidos por completo são apagados.
+
+    A entrega é pelo menos uma vez: uma queda entre a gravação de um lote
+    e a da posição faz o lote ser gravado de novo no próximo início. Cada
+    documento ganha o seu _id ao entrar no spool, pelo qual os bancos
+    descartam as cópias, exceto as collections time-series do MongoDB.
+    """
+    def __init__(
+            self,
+            name: str,
+            sink: Callable[[str, List[Dict]], bool],
+            directory: str=CONF.spool_dir,
+            segment_size: int=CONF.spool_segment_size,
+            batch_size: int=CONF.spool_batch_size,
+        ) -> None:
+        self._dir = os.path.join(directory, name)
+        self._sink = sink
+        self._segment_size = segment_size
+        self._batch_size = max(1, batch_size)
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = threading.Thread(target=self.__run, daemon=True)
+
+        os.makedirs(self._dir, exist_ok=True)
+        _segments = self.__segments()
+        # Sempre começa um segmento novo, os anteriores ficam só para leitura.
+        self._write_id = _segments[-1] + 1 if _segments else 0
+        self._file = open(self.__path(self._write_id), 'ab')
+        self._read_id, self._read_offset = self.__load_position(_segments)
+
+    def start(self) -> None:
+        self._running = True
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Para a thread de gravação. O que não foi gravado fica no disco.
+        """
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+
+        self._thread.join()
+        self._file.close()
+
+    def append(self, collection: str, documents: List[Dict]) -> None:
+        _data = []
+
+        for _doc in documents:
+            # O _id fixado aqui faz o banco recusar o documento gravado de novo.
+            _raw = bson.encode({'c': collection, 'd': {'_id': ObjectId(), **_doc}})
+            _data.append(_HEADER.pack(len(_raw), zlib.crc32(_raw)))
+            _data.append(_raw)
+
+        with self._cond:
+            self._file.write(b''.join(_data))
+            self._file.flush()
+
+            if self._file.tell() >= self._segment_size:
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._write_id += 1
+                self._file = open(self.__path(self._write_id), 'ab')
+
+            self._cond.notify()
+
+    def __path(self, segment: int) -> str:
+        return os.path.join(self._dir, f'{segment:016d}.seg')
+
+    def __segments(self) -> List[int]:
+        return sorted(int(f[:-4]) for f in os.listdir(self._dir) if f.endswith('.seg'))
+
+    def __load_position(self, segments: List[int]) -> Tuple[int, int]:
+        try:
+            with open(os.path.join(self._dir, 'position'), 'rb') as f:
+                _segment, _offset = _POSITION.unpack(f.read(_POSITION.size))
+        except (OSError, struct.error):
+            _segment, _offset = 0, 0
+
+        # A posição pode apontar para um segmento que já foi apagado.
+        if segments and _segment < segments[0]:
+            return segments[0], 0
+
+        return _segment, _offset
+
+    def __save_position(self) -> None:
+        _path = os.path.join(self._dir, 'position')
+
+        with open(f'{_path}.tmp', 'wb') as f:
+            f.write(_POSITION.pack(self._read_id, self._read_offset))
+
+        os.replace(f'{_path}.tmp', _path)
+
+    def __read(self) -> Tuple[List[Tuple[str, Dict]], int]:
+        """
+        Lê até um lote de registros a partir da posição atual. Um registro
+        incompleto no fim do segmento é deixado para a próxima leitura.
+        """
+        _records = []
+
+        try:
+            f = open(self.__path(self._read_id), 'rb')
+        except FileNotFoundError:
+            return _records, self._read_offset
+
+        with f:
+            f.seek(self._read_offset)
+            _offset = self._read_offset
+
+            while len(_records) < self._batch_size:
+                _header = f.read(_HEADER.size)
+
+                if len(_header) < _HEADER.size:
+                    break
+
+                _size, _crc = _HEADER.unpack(_header)
+                _raw = f.read(_size)
+
+                if len(_raw) < _size:
+                    break
+
+                _offset += _HEADER.size + _size
+
+                if zlib.crc32(_raw) != _crc:
+                    _log.error('Corrupted spool record at %s:%s', self._read_id, _offset)
+                    continue
+
+                _doc = bson.decode(_raw)
+                _records.append((_doc['c'], _doc['d']))
+
+        return _records, _offset
+
+    def __write(self, records: List[Tuple[str, Dict]]) -> bool:
+        for _collection, _group in groupby(records, key=lambda r: r[0]):
+            _docs = [r[1] for r in _group]
+
+            while not self._sink(_collection, _docs):
+                # Espera o banco voltar, sem prender o encerramento.
+                with self._cond:
+                    if not self._running:
+                        return False
+
+                    self._cond.wait(5)
+
+        return True
+
+    def __run(self) -> None:
+        while True:
+            # Verificado antes da leitura: um segmento fechado não recebe
+            # mais registros, então uma leitura vazia indica que acabou.
+            with self._cond:
+                _sealed = self._read_id < self._write_id
+
+            _records, _offset = self.__read()
+
+            # Registros corrompidos também avançam a posição.
+            if _records or _offset != self._read_offset:
+                if not self.__write(_records):
+                    return
+
+                self._read_offset = _offset
+                self.__save_position()
+            elif _sealed:
+                try:
+                    os.remove(self.__path(self._read_id))
+                except FileNotFoundError:
+                    pass
+
+                self._read_id, self._read_offset = self._read_id + 1, 0
+                self.__save_position()
+            else:
+                with self._cond:
+                    if not self._running:
+                        return
+
+                    self._cond.wait(1)
@@ -0,0 +1,160 @@
+import logging
+import socket
+import struct
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List
+
+from core.daemons.capture import PACKET_STATISTICS, SOL_PACKET
+from settings.config import CONF
+
+_log = logging.getLogger(__name__)
+_log.setLevel(CONF.log_level)
+
+# tp_packets e tp_drops, comuns a tpacket_stats e tpacket_stats_v3.
+_KERNEL_STATS = struct.Struct('=II')
+
+
+def _interface(record: Any) -> str | None:
+    """
+    Interface de um registro, seja um PacketRecord ou um documento.
+    """
+    if isinstance(record, dict):
+        return record.get('interface')
+
+    return record.interface
+
+
+_CAPTURED, _ENQUEUED, _PERSISTED, _DROPPED, _FAILED, _KERNEL_PACKETS, _KERNEL_DROPS = range(7)
+
+
+class CaptureStats:
+    """
+    Contadores por interface do caminho de captura.
+
+    - captured: pacotes que chegaram ao processamento.
+    - enqueued: registros aceitos na fila de gravação.
+    - persisted: registros gravados no banco.
+    - dropped: registros descartados pela política da fila.
+    - failed: registros recusados pelo banco.
+    - kernel_packets/kernel_drops: lidos do PACKET_STATISTICS dos sockets.
+
+    Os registros são pacotes no modo "raw" e documentos de fluxo no modo
+    "flow", indicado em `mode`, então só no modo "raw" captured e
+    enqueued são comparáveis.
+
+    Os contadores são alterados pelas threads de captura, de gravação, de
+    janelas e pela própria, por isso ficam sob um lock. Os totais desde o
+    início do worker são gravados periodicamente.
+    """
+    def __init__(
+            self,
+            worker: int,
+            persist: Callable[[List[Dict]], None],
+            interval: int=CONF.capture_stats_interval,
+            mode: str=CONF.capture_mode,
+        ) -> None:
+        self._worker = worker
+        self._persist = persist
+        self._interval = max(1, interval)
+        self._mode = mode
+        self._lock = threading.Lock()
+        self._counters = defaultdict(lambda: [0] * 7)
+        self._sockets = []
+        self._running = threading.Event()
+        self._thread = threading.Thread(target=self.__run, daemon=True)
+
+    def start(self) -> None:
+        self._running.set()
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._running.clear()
+        self._thread.join()
+
+    @property
+    def running(self) -> bool:
+        return self._running.is_set()
+
+    def watch(self, sock: socket.socket, iface: str | None) -> None:
+        """
+        Registra um socket AF_PACKET para leitura das perdas do kernel.
+        """
+        self._sockets.append((sock, iface or 'all'))
+
+    def captured(self, iface: str) -> None:
+        with self._lock:
+            self._counters[iface][_CAPTURED] += 1
+
+    def enqueued(self, record: Any) -> None:
+        with self._lock:
+            self._counters[_interface(record)][_ENQUEUED] += 1
+
+    def dropped(self, record: Any) -> None:
+        with self._lock:
+            self._counters[_interface(record)][_DROPPED] += 1
+
+    def persisted(self, records: List[Any]) -> None:
+        with self._lock:
+            for r in records:
+                self._counters[_interface(r)][_PERSISTED] += 1
+
+    def failed(self, records: List[Any]) -> None:
+        with self._lock:
+            for r in records:
+                self._counters[_interface(r)][_FAILED] += 1
+
+    def __kernel(self) -> None:
+        """
+        Acumula as estatísticas do kernel, que são zeradas a cada leitura.
+        """
+        for _sock, _iface in self._sockets:
+            try:
+                _raw = _sock.getsockopt(SOL_PACKET, PACKET_STATISTICS, 12)
+            except OSError as e:
+                _log.debug(e.args)
+                continue
+
+            _packets, _drops = _KERNEL_STATS.unpack_from(_raw)
+
+            with self._lock:
+                _c = self._counters[_iface]
+                _c[_KERNEL_PACKETS] += _packets
+                _c[_KERNEL_DROPS] += _drops
+
+    def snapshot(self) -> List[Dict]:
+        self.__kernel()
+        _now = time.time()
+        _date = datetime.fromtimestamp(_now, timezone.utc)
+
+        with self._lock:
+            _counters = [(_iface, list(_c)) for _iface, _c in self._counters.items()]
+
+        return [{
+            'worker': self._worker,
+            'interface': _iface,
+            'mode': self._mode,
+            'captured': _c[_CAPTURED],
+            'enqueued': _c[_ENQUEUED],
+            'persisted': _c[_PERSISTED],
+            'dropped': _c[_DROPPED],
+            'failed': _c[_FAILED],
+            'kernel_packets': _c[_KERNEL_PACKETS],
+            'kernel_drops': _c[_KERNEL_DROPS],
+            'timestamp': _now,
+            'date': _date,
+        } for _iface, _c in _counters]
+
+    def __run(self) -> None:
+        _next = time.monotonic() + self._interval
+
+        while self._running.is_set():
+            time.sleep(min(1, max(0, _next - time.monotonic())))
+
+            if time.monotonic() >= _next:
+                _next += self._interval
+                self._persist(self.snapshot())
+
+        self._persist(self.snapshot())
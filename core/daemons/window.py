@@ -0,0 +1,61 @@
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from settings.config import CONF
+
+_log = logging.getLogger(__name__)
+_log.setLevel(CONF.log_level)
+
+
+class Windowed(ABC):
+    """
+    Base dos agregadores por janela de tempo.
+
+    Uma thread chama `flush` com o início de cada janela, alinhada ao
+    relógio, assim que ela termina. Ao parar, a janela aberta também é
+    emitida. Um erro em um `flush` perde só aquela janela.
+    """
+    def __init__(self, window: int) -> None:
+        self._window = max(1, window)
+        self._lock = threading.Lock()
+        self._running = threading.Event()
+        self._thread = threading.Thread(target=self.__run, daemon=True)
+
+    def start(self) -> None:
+        self._running.set()
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Encerra a thread de janelas emitindo a janela ainda aberta.
+        """
+        self._running.clear()
+        self._thread.join()
+
+    @abstractmethod
+    def flush(self, start: float) -> None:
+        """
+        Emite a janela iniciada em `start`.
+        """
+
+    def __flush(self, start: float) -> None:
+        try:
+            self.flush(start)
+        except Exception:
+            _log.exception('%s failed to flush the window at %s', type(self).__name__, start)
+
+    def __run(self) -> None:
+        _start = time.time() // self._window * self._window
+
+        while self._running.is_set():
+            _end = _start + self._window
+            # Acorda periodicamente para perceber o pedido de parada.
+            time.sleep(min(1, max(0, _end - time.time())))
+
+            if time.time() >= _end:
+                self.__flush(_start)
+                _start = _end
+
+        self.__flush(_start)
@@ -0,0 +1,136 @@
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Collection, List
+
+from settings.config import CONF
+
+_log = logging.getLogger(__name__)
+_log.setLevel(CONF.log_level)
+
+
+class BatchWriter:
+    """
+    Buffer de escrita em lote.
+
+    Os registros ficam em uma fila limitada em memória e uma thread os
+    descarrega em lotes, quando o lote atinge o tamanho configurado ou
+    quando o registro mais antigo espera mais que a latência máxima.
+
+    Com a fila cheia, a política define o que acontece: "block" espera por
+    espaço, "drop-oldest" descarta o registro mais antigo da fila e
+    "drop-newest" descarta o registro que está chegando.
+
+    `flush` devolve os índices dos registros do lote que o banco recusou.
+    """
+    _stop = object()
+    _policies = ('block', 'drop-oldest', 'drop-newest')
+
+    def __init__(
+            self,
+            flush: Callable[[List[Any]], Collection[int]],
+            batch_size: int=CONF.pkg_batch_size,
+            latency: float=CONF.pkg_batch_latency,
+            queue_size: int=CONF.pkg_queue_size,
+            policy: str=CONF.capture_queue_policy,
+            stats: Any=None,
+        ) -> None:
+        if policy not in self._policies:
+            raise ValueError(f'Invalid queue policy {policy}, use one of {self._policies}')
+
+        self._flush = flush
+        self._batch_size = max(1, batch_size)
+        self._latency = latency
+        self._policy = policy
+        self._stats = stats
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self.__run, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Descarrega o que estiver no buffer e encerra a thread de escrita.
+        """
+        self._queue.put(self._stop)
+        self._thread.join()
+
+    def put(self, record: Any) -> bool:
+        """
+        Enfileira um registro para gravação. Devolve se ele foi aceito.
+        """
+        if self._policy == 'block':
+            self._queue.put(record)
+        elif self._policy == 'drop-newest':
+            try:
+                self._queue.put_nowait(record)
+            except queue.Full:
+                self.__dropped(record)
+                return False
+        else:
+            while True:
+                try:
+                    self._queue.put_nowait(record)
+                    break
+                except queue.Full:
+                    try:
+                        self.__dropped(self._queue.get_nowait())
+                    except queue.Empty:
+                        pass
+
+        if self._stats:
+            self._stats.enqueued(record)
+
+        return True
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    def __dropped(self, record: Any) -> None:
+        if self._stats:
+            self._stats.dropped(record)
+
+    def __write(self, batch: List[Any]) -> None:
+        try:
+            _failed = self._flush(batch) or ()
+        except Exception as e:
+            _log.error(e.args)
+            _failed = range(len(batch))
+
+        if self._stats:
+            if _failed:
+                _failed = set(_failed)
+                self._stats.failed([r for i, r in enumerate(batch) if i in _failed])
+                self._stats.persisted([r for i, r in enumerate(batch) if i not in _failed])
+            else:
+                self._stats.persisted(batch)
+
+    def __run(self) -> None:
+        _batch = []
+        _deadline = 0
+
+        while True:
+            _timeout = max(0, _deadline - time.monotonic()) if _batch else None
+
+            try:
+                _item = self._queue.get(timeout=_timeout)
+            except queue.Empty:
+                self.__write(_batch)
+                _batch = []
+                continue
+
+            if _item is self._stop:
+                if _batch:
+                    self.__write(_batch)
+                return
+
+            if not _batch:
+                _deadline = time.monotonic() + self._latency
+
+            _batch.append(_item)
+
+            if len(_batch) >= self._batch_size:
+                self.__write(_batch)
+                _batch = []
@@ -0,0 +1,9 @@
+from settings.config import CONF
+
+# Os modelos do banco escolhido em storageEngine, todos com a mesma interface.
+if CONF.db_engine == 'sqlite':
+    from core.models.sqlite.auth import Auth
+    from core.models.sqlite.network import Network
+else:
+    from core.models.auth import Auth
+    from core.models.network import Network
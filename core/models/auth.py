@@ -1,5 +1,5 @@
 import logging
-from typing import Dict, List
+from typing import Dict, List, Tuple
 
 from pymongo import ASCENDING, DESCENDING, IndexModel, MongoClient
 from pymongo.errors import DuplicateKeyError
@@ -37,7 +37,12 @@ class Auth:
             _log.info('Created user %s', _response.inserted_id)
             return str(_response.inserted_id)
 
-    async def get_user(self, query: Dict={}, fields: Dict={}) -> List[Dict]:
+    async def get_user(
+            self,
+            query: Dict={},
+            fields: Dict={},
+            sort: List[Tuple[str, int]]=[],
+        ) -> List[Dict]:
         """
         Recupera usuários do banco de dados.
         """
@@ -48,8 +53,12 @@ class Auth:
             _log.debug('Invalid filter content.')
             return
 
-        _response = await self._db.user.find(query, fields)\
-            .to_list(CONF.db_response_limit)
+        _cursor = self._db.user.find(query, fields)
+
+        if sort:
+            _cursor = _cursor.sort(sort)
+
+        _response = await _cursor.to_list(CONF.db_response_limit)
 
         if not isinstance(_response, list):
             return []
@@ -1,10 +1,15 @@
 import logging
-from typing import Dict, List
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, Tuple
 
-from pymongo import ASCENDING, DESCENDING, IndexModel, MongoClient
-from pymongo.errors import DuplicateKeyError
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, DESCENDING, IndexModel, MongoClient, UpdateOne
+from pymongo.database import Database
+from pymongo.errors import BulkWriteError, PyMongoError
 from motor.motor_asyncio import AsyncIOMotorClient
 
+from core.utils.sketch import HyperLogLog, SpaceSaving
 from settings.config import CONF
 
 _log = logging.getLogger(__name__)
@@ -18,6 +23,20 @@ class Network:
         host=CONF.db_host,
         port=CONF.db_port
     )[CONF.db_name]
+    _sync_db = None
+
+    @property
+    def sync_db(self):
+        """
+        Cliente síncrono, criado uma única vez por processo e reutilizado.
+        """
+        if Network._sync_db is None:
+            Network._sync_db = MongoClient(
+                host=CONF.db_host,
+                port=CONF.db_port
+            )[CONF.db_name]
+
+        return Network._sync_db
 
     async def set_interfaces(self, interfaces: List[Dict]) -> None:
         """
@@ -34,7 +53,53 @@ class Network:
         else:
             _log.info('Insert interfaces %s', str(_result.inserted_ids))
 
-    async def get_interfaces(self, query: Dict={}, fields: Dict={}) -> List[Dict]:
+    async def set_interface_rollups(self, rollups: List[Dict]) -> None:
+        """
+        Insere os buckets fechados das faixas de agregação das interfaces.
+        """
+        if not isinstance(rollups, (list, tuple)) or not rollups:
+            return
+
+        try:
+            _response = await self._db.interface_rollup.insert_many(rollups, ordered=False)
+        except Exception as e:
+            _log.error(e.args)
+        else:
+            _log.info('Insert %s interface rollups', len(_response.inserted_ids))
+
+    async def get_interface_rollups(
+            self,
+            tier: int,
+            start: float,
+            end: float,
+            query: Dict={},
+            fields: Dict={},
+            limit: int=CONF.db_response_limit,
+        ) -> List[Dict]:
+        """
+        Recupera os `limit` buckets mais recentes de uma faixa de agregação
+        entre `start` e `end`, em ordem crescente de tempo.
+        """
+        if query and not isinstance(query, dict):
+            _log.error('Invalid query content.')
+            return
+
+        _query = dict(query, tier=tier, timestamp={'$gte': start, '$lt': end})
+        _response = await self._db.interface_rollup.find(_query, fields or {'window': 0, 'expire': 0})\
+            .sort({'timestamp': DESCENDING})\
+            .to_list(limit)
+
+        if not isinstance(_response, list):
+            return []
+
+        return [self.__document('interface_rollup', r) for r in reversed(_response)]
+
+    async def get_interfaces(
+            self,
+            query: Dict={},
+            fields: Dict={},
+            sort: List[Tuple[str, int]]=[],
+        ) -> List[Dict]:
         """
         Recupera a lista de interfaces do banco de dados.
         """
@@ -47,36 +112,115 @@ class Network:
             _log.error('Invalid fields for filter.')
             return
 
+        # Ordena pelo campo de tempo da time-series, não pelo timestamp.
         _response = await self._db.interface.find(query, fields)\
-            .sort({'timestamp': DESCENDING})\
+            .sort(sort or [('date', DESCENDING)])\
             .to_list(CONF.db_response_limit)
 
         if not isinstance(_response, list):
             return []
 
-        for i, r in enumerate(_response):
-            _response[i]['_id'] = str(r['_id'])
-
-        return _response
+        return [self.__document('interface', r) for r in _response]
 
-    async def set_connections(self, connections: List[Dict]) -> None:
+    async def set_connections(self, connections: List[Dict], closed: List[Dict]=[]) -> None:
         """
-        Seta uma conexão.
+        Atualiza o estado das conexões, uma por (local_host, remote_host, pid).
+
+        Conexões novas são inseridas com `first_seen` e as existentes têm o
+        status, os dados do processo e o `last_seen` atualizados. As
+        fechadas ficam com o status "CLOSE" até o TTL do `last_seen`
+        removê-las.
         """
-        if not isinstance(connections, (list, tuple)) or not connections:
+        if not isinstance(connections, (list, tuple)) or not isinstance(closed, (list, tuple)):
             _log.debug('Invalid connection content.')
             return
 
+        _now = datetime.now(timezone.utc)
+        _operations = [UpdateOne(
+            self.__connection_key(c),
+            {
+                '$setOnInsert': {'first_seen': _now},
+                '$set': dict(
+                    {a: c.get(a) for a in ('status', 'name', 'exe', 'username', 'cmdline')},
+                    last_seen=_now,
+                ),
+            },
+            upsert=True,
+        ) for c in connections] + [UpdateOne(
+            self.__connection_key(c),
+            {'$set': {'status': 'CLOSE'}},
+        ) for c in closed]
+
+        if not _operations:
+            return
+
         try:
-            _response = await self._db.process.insert_many(connections)
-        except DuplicateKeyError:
-            _log.debug('Duplicated connections: %s', str(connections))
+            _response = await self._db.process.bulk_write(_operations, ordered=False)
+        except BulkWriteError as e:
+            _log.error('Update connections partially failed: %s', e.details.get('writeErrors', [])[:1])
         except Exception as e:
-            _log.debug(e.args)
+            _log.error(e.args)
+        else:
+            _log.info(
+                'Upsert connections: %s inserted, %s updated',
+                _response.upserted_count,
+                _response.modified_count,
+            )
+
+    @staticmethod
+    def __connection_key(connection: Dict) -> Dict:
+        return {
+            'local_host': connection['local_host'],
+            'remote_host': connection['remote_host'],
+            'pid': connection['pid'],
+        }
+
+    async def set_connection_events(self, events: List[Dict]) -> None:
+        """
+        Insere os eventos de abertura, fechamento e mudança das conexões.
+        """
+        if not isinstance(events, (list, tuple)) or not events:
+            _log.debug('Invalid connection event content.')
+            return
+
+        try:
+            _response = await self._db.connection_event.insert_many(events, ordered=False)
+        except Exception as e:
+            _log.error(e.args)
         else:
-            _log.info('Insert connection %s', _response.inserted_ids)
+            _log.info('Insert %s connection events', len(_response.inserted_ids))
 
-    async def get_processes(self, query: Dict={}, fields: Dict={}) -> List[Dict]:
+    async def get_connection_events(
+            self,
+            query: Dict={},
+            fields: Dict={},
+            sort: List[Tuple[str, int]]=[],
+        ) -> List[Dict]:
+        """
+        Recupera os eventos mais recentes das conexões.
+        """
+        if query and not isinstance(query, dict):
+            _log.error('Invalid query content.')
+            return
+        elif fields and not isinstance(fields, dict):
+            _log.debug('Invalid filter content.')
+            return
+
+        _response = await self._db.connection_event.find(query, fields)\
+            .sort(sort or [('timestamp', DESCENDING)])\
+            .to_list(CONF.db_response_limit)
+
+        if not isinstance(_response, list):
+            return []
+
+        return [self.__document('connection_event', r) for r in _response]
+
+    async def get_processes(
+            self,
+            query: Dict={},
+            fields: Dict={},
+            sort: List[Tuple[str, int]]=[],
+        ) -> List[Dict]:
         """
         Recupera as conexões salvas no banco.
         """
@@ -85,15 +229,13 @@ class Network:
             return
 
         _response = await self._db.process.find(query, fields)\
+            .sort(sort or [('last_seen', DESCENDING)])\
             .to_list(CONF.db_response_limit)
 
         if not isinstance(_response, list):
             return []
 
-        for i, r in enumerate(_response):
-            _response[i]['_id'] = str(r['_id'])
-
-        return _response
+        return [self.__document('process', r) for r in _response]
 
     def set_package(self, package: Dict) -> None:
         """
@@ -103,18 +245,89 @@ class Network:
             _log.debug('Invalid package content.\nContent: %s' % str(package))
             return
 
+        self.set_packages([package])
+
+    def set_packages(self, packages: List[Dict]) -> List[int]:
+        """
+        Insere um lote de pacotes no banco de dados.
+        """
+        return self.__insert_batch('package', packages)
+
+    def set_flows(self, flows: List[Dict]) -> List[int]:
+        """
+        Insere um lote de fluxos agregados no banco de dados.
+        """
+        return self.__insert_batch('flow', flows)
+
+    def set_capture_stats(self, stats: List[Dict]) -> List[int]:
+        """
+        Insere os contadores dos workers de captura.
+        """
+        return self.__insert_batch('capture_stats', stats)
+
+    def set_top_talkers(self, snapshots: List[Dict]) -> List[int]:
+        """
+        Insere os sketches dos maiores consumidores de uma janela.
+        """
+        return self.__insert_batch('top_talkers', snapshots)
+
+    def set_peer_sketches(self, sketches: List[Dict]) -> List[int]:
+        """
+        Insere os HyperLogLog de origens e destinos distintos de uma janela.
+        """
+        return self.__insert_batch('peer_sketch', sketches)
+
+    def insert_spooled(self, collection: str, documents: List[Dict]) -> bool:
+        """
+        Grava um lote vindo do spool. Só devolve falso quando o banco não
+        está acessível, para que o lote seja tentado de novo. Documentos
+        recusados não voltam para o spool, e os já gravados por uma
+        tentativa anterior são ignorados pelo _id dado no spool, exceto nas
+        collections time-series, que não têm índice único no _id.
+        """
         try:
-            _db = MongoClient(
-                host=CONF.db_host,
-                port=CONF.db_port
-            )[CONF.db_name]
-            _response = _db.package.insert_one(package)
+            self.sync_db[collection].insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            _errors = [_e for _e in e.details.get('writeErrors', []) if _e.get('code') != 11000]
+
+            if _errors:
+                _log.error('Insert %s partially failed: %s', collection, _errors[:1])
+        except PyMongoError as e:
+            _log.warning('Database unavailable, keeping %s %s in the spool: %s', len(documents), collection, e)
+            return False
+        else:
+            _log.info('Insert %s %s from spool', len(documents), collection)
+
+        return True
+
+    def __insert_batch(self, collection: str, documents: List[Dict]) -> List[int]:
+        """
+        Insere um lote sem ordem, para que um documento inválido não aborte
+        o restante do lote. Devolve os índices dos documentos recusados.
+        """
+        if not isinstance(documents, (list, tuple)) or not documents:
+            _log.debug('Invalid %s content.', collection)
+            return []
+
+        try:
+            _response = self.sync_db[collection].insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            _errors = e.details.get('writeErrors', [])
+            _log.error('Insert %s partially failed: %s', collection, _errors[:1])
+            return [_e['index'] for _e in _errors]
         except Exception as e:
             _log.error(e.args)
+            return list(range(len(documents)))
         else:
-            _log.info('Insert package %s', _response.inserted_id)
+            _log.info('Insert %s %s', len(_response.inserted_ids), collection)
+            return []
 
-    async def get_packages(self, query: Dict={}, fields: Dict={}) -> List[Dict]:
+    async def get_packages(
+            self,
+            query: Dict={},
+            fields: Dict={},
+            sort: List[Tuple[str, int]]=[],
+        ) -> List[Dict]:
         """
         Recupera as conexões salvas no banco.
         """
@@ -125,16 +338,345 @@ class Network:
             _log.debug('Invalid filter content.')
             return
 
-        _response = await self._db.package.find(query, fields)\
+        _cursor = self._db.package.find(query, fields)
+
+        if sort:
+            _cursor = _cursor.sort(sort)
+
+        _response = await _cursor.to_list(CONF.db_response_limit)
+
+        if not isinstance(_response, list):
+            return []
+
+        return [self.__document('package', r) for r in _response]
+
+    async def get_flows(
+            self,
+            query: Dict={},
+            fields: Dict={},
+            sort: List[Tuple[str, int]]=[],
+        ) -> List[Dict]:
+        """
+        Recupera os fluxos agregados salvos no banco.
+        """
+        if query and not isinstance(query, dict):
+            _log.error('Invalid query content.')
+            return
+        elif fields and not isinstance(fields, dict):
+            _log.debug('Invalid filter content.')
+            return
+
+        _response = await self._db.flow.find(query, fields)\
+            .sort(sort or [('timestamp', DESCENDING)])\
+            .to_list(CONF.db_response_limit)
+
+        if not isinstance(_response, list):
+            return []
+
+        return [self.__document('flow', r) for r in _response]
+
+    async def get_capture_stats(
+            self,
+            query: Dict={},
+            fields: Dict={},
+            sort: List[Tuple[str, int]]=[],
+        ) -> List[Dict]:
+        """
+        Recupera os contadores mais recentes dos workers de captura.
+        """
+        if query and not isinstance(query, dict):
+            _log.error('Invalid query content.')
+            return
+        elif fields and not isinstance(fields, dict):
+            _log.debug('Invalid filter content.')
+            return
+
+        _response = await self._db.capture_stats.find(query, fields)\
+            .sort(sort or [('timestamp', DESCENDING)])\
             .to_list(CONF.db_response_limit)
 
         if not isinstance(_response, list):
             return []
 
-        for i, r in enumerate(_response):
-            _response[i]['_id'] = str(r['_id'])
+        return [self.__document('capture_stats', r) for r in _response]
+
+    async def scan(
+            self,
+            collection: str,
+            time_field: str,
+            query: Dict={},
+            fields: Dict={},
+            after: Tuple[float, str] | None=None,
+            ascending: bool=False,
+            limit: int | None=None,
+        ) -> AsyncIterator[Dict]:
+        """
+        Percorre a collection na ordem de (`time_field`, _id), a partir da
+        chave `after` do último documento já lido, sem pular nem repetir
+        documentos de mesmo tempo. Lê `streamBatchSize` documentos por vez
+        do cursor, então a memória não cresce com o tamanho do resultado.
+        """
+        _query = dict(query)
+        _direction = ASCENDING if ascending else DESCENDING
+
+        if after is not None:
+            _value, _id = after
+
+            try:
+                _id = ObjectId(_id)
+            except (InvalidId, TypeError):
+                raise ValueError('Invalid cursor!')
+
+            # As datas das conexões voltam como timestamps, com milissegundos.
+            if collection == 'process':
+                _value = datetime.fromtimestamp(round(_value, 3), timezone.utc)
+
+            _op, _bound = ('$gt', '$gte') if ascending else ('$lt', '$lte')
+            _and = [query] if query else []
+            # O limite no tempo usa o índice e o `$or` desempata pelo _id.
+            _and.append({time_field: {_bound: _value}})
+            _and.append({'$or': [{time_field: {_op: _value}}, {'_id': {_op: _id}}]})
+            _query = {'$and': _and}
+
+        _cursor = self._db[collection].find(_query, fields)\
+            .sort([(time_field, _direction), ('_id', _direction)])\
+            .batch_size(CONF.stream_batch_size)
+
+        if limit:
+            _cursor = _cursor.limit(limit)
+
+        try:
+            async for _doc in _cursor:
+                yield self.__document(collection, _doc)
+        finally:
+            await _cursor.close()
+
+    @staticmethod
+    def __document(collection: str, document: Dict) -> Dict:
+        """
+        Converte um documento do banco para a resposta da API.
+        """
+        if '_id' in document:
+            document['_id'] = str(document['_id'])
+
+        document.pop('date', None)
+
+        if collection == 'process':
+            for _f in ('first_seen', 'last_seen'):
+                if _f in document:
+                    document[_f] = document[_f].replace(tzinfo=timezone.utc).timestamp()
+        elif collection == 'flow':
+            if 'window' in document:
+                document['window'] = document['window'].replace(tzinfo=timezone.utc).timestamp()
+        elif collection == 'package':
+            # Cada pacote amostrado representa `sampling_rate` pacotes.
+            if 'sampling_rate' in document:
+                document['estimated_packets'] = document['sampling_rate']
+
+                if 'pkg_len' in document:
+                    document['estimated_bytes'] = document['pkg_len'] * document['sampling_rate']
+
+        return document
+
+    async def get_interface_series(
+            self,
+            start: float,
+            end: float,
+            step: float,
+            query: Dict={},
+            limit: int=CONF.page_max_limit,
+        ) -> List[Dict]:
+        """
+        Agrega as amostras das interfaces em intervalos de `step` segundos,
+        com o mínimo, o máximo e a média das velocidades.
+        """
+        _metrics = ('upload_speed', 'download_speed')
+        _group = {'samples': {'$sum': 1}}
+        _project = {'samples': 1}
+
+        for _m in _metrics:
+            for _agg in ('min', 'max', 'avg'):
+                _group[f'{_m}_{_agg}'] = {f'${_agg}': f'${_m}'}
+
+            _project[_m] = {_agg: f'${_m}_{_agg}' for _agg in ('min', 'max', 'avg')}
+
+        return await self.__series('interface', 'interface', start, end, step, query, _group, _project, limit)
+
+    async def get_package_series(
+            self,
+            start: float,
+            end: float,
+            step: float,
+            key: str='interface',
+            query: Dict={},
+            limit: int=CONF.page_max_limit,
+        ) -> List[Dict]:
+        """
+        Agrega os pacotes por `key` em intervalos de `step` segundos, com a
+        quantidade de pacotes e de bytes estimada pela taxa de amostragem.
+        """
+        _rate = {'$ifNull': ['$sampling_rate', 1]}
+        _group = {
+            'samples': {'$sum': 1},
+            'estimated_packets': {'$sum': _rate},
+            'estimated_bytes': {'$sum': {'$multiply': ['$pkg_len', _rate]}},
+            'pkg_len_min': {'$min': '$pkg_len'},
+            'pkg_len_max': {'$max': '$pkg_len'},
+            'pkg_len_avg': {'$avg': '$pkg_len'},
+        }
+        _project = {
+            'samples': 1,
+            'estimated_packets': 1,
+            'estimated_bytes': 1,
+            'pkg_len': {_agg: f'$pkg_len_{_agg}' for _agg in ('min', 'max', 'avg')},
+        }
+
+        return await self.__series('package', key, start, end, step, query, _group, _project, limit)
+
+    async def __series(
+            self,
+            collection: str,
+            key: str,
+            start: float,
+            end: float,
+            step: float,
+            query: Dict,
+            group: Dict,
+            project: Dict,
+            limit: int,
+        ) -> List[Dict]:
+        """
+        Roda no banco a agregação por `key` e pelo início do intervalo de
+        `step` segundos, devolvendo no máximo `limit` pontos. O período
+        filtra pelo `date`, indexado nas duas formas das collections de
+        amostras.
+        """
+        _pipeline = [
+            {'$match': dict(query, date={
+                '$gte': datetime.fromtimestamp(start, timezone.utc),
+                '$lt': datetime.fromtimestamp(end, timezone.utc),
+            })},
+            {'$group': dict(group, _id={
+                'key': f'${key}',
+                'timestamp': {'$subtract': ['$timestamp', {'$mod': ['$timestamp', step]}]},
+            })},
+            {'$project': dict(project, _id=0, timestamp='$_id.timestamp', **{key: '$_id.key'})},
+            {'$sort': {'timestamp': ASCENDING, key: ASCENDING}},
+            {'$limit': limit},
+        ]
+
+        return await self._db[collection].aggregate(_pipeline).to_list(None)
+
+    async def get_top_talkers(self, dimension: str, metric: str, k: int=10, windows: int=1) -> List[Dict]:
+        """
+        Soma os sketches das últimas `windows` janelas, de todos os workers,
+        e devolve os k maiores itens. Lê só os documentos das janelas.
+        """
+        _query = {'dimension': dimension, 'metric': metric}
+        _last = await self._db.top_talkers.find_one(
+            _query,
+            {'timestamp': 1},
+            sort=[('timestamp', DESCENDING)],
+        )
+
+        if not _last:
+            return []
+
+        _query['timestamp'] = {'$gt': _last['timestamp'] - windows * CONF.top_window}
+        _snapshots = await self._db.top_talkers.find(_query, {'items': 1, 'minimum': 1}).to_list(None)
 
-        return _response
+        return [{
+            'key': _key,
+            metric: _value,
+            'error': _error,
+        } for _key, _value, _error in SpaceSaving.merge(_snapshots, k)]
+
+    async def get_distinct_peers(
+            self,
+            kind: str,
+            start: float,
+            end: float,
+            interface: str | None=None,
+        ) -> Dict:
+        """
+        Combina os HyperLogLog das janelas iniciadas entre `start` e `end`,
+        de uma interface ou de todas, e devolve a quantidade de distintos.
+        Os sketches são combinados um a um, em memória constante.
+        """
+        _query = {
+            'kind': kind,
+            'timestamp': {'$gte': start, '$lt': end},
+        }
+
+        if interface:
+            _query['interface'] = interface
+
+        _hll = None
+        _buckets = 0
+
+        async for _doc in self._db.peer_sketch.find(_query, {'registers': 1, 'precision': 1}):
+            _sketch = HyperLogLog.from_bytes(_doc['registers'], _doc['precision'])
+
+            if _hll is None:
+                _hll = _sketch
+            else:
+                _hll.merge(_sketch)
+
+            _buckets += 1
+
+        return {
+            'interface': interface,
+            'kind': kind,
+            'start': start,
+            'end': end,
+            'buckets': _buckets,
+            'distinct': _hll.count() if _hll else 0,
+        }
+
+    @staticmethod
+    def __samples(db: Database, name: str, meta: str) -> None:
+        """
+        Cria uma collection de amostras, com `date` como campo de tempo.
+        Com mongoTimeSeries ela é criada como time-series, agrupada por
+        `meta`, e expira pelo próprio servidor. Sem, usa um índice TTL. As
+        duas formas têm o índice de (timestamp, _id) da paginação.
+        """
+        if not CONF.db_time_series:
+            db[name].create_indexes([
+                IndexModel([
+                    ('date', ASCENDING)
+                ], expireAfterSeconds=CONF.db_expire_time),
+                IndexModel([
+                    ('timestamp', DESCENDING),
+                    ('_id', DESCENDING),
+                ]),
+            ])
+            return
+
+        _info = next(db.list_collections(filter={'name': name}), None)
+
+        if _info is None:
+            db.create_collection(
+                name,
+                timeseries={
+                    'timeField': 'date',
+                    'metaField': meta,
+                    'granularity': 'seconds',
+                },
+                expireAfterSeconds=CONF.db_expire_time,
+            )
+        elif _info.get('type') != 'timeseries':
+            _log.warning('Collection %s already exists and is not a time-series, drop it to convert.', name)
+
+        db[name].create_index([
+            (meta, ASCENDING),
+            ('date', DESCENDING),
+        ])
+        # Usado pela paginação. Índices secundários em time-series exigem o MongoDB 6.0.
+        db[name].create_index([
+            ('timestamp', DESCENDING),
+            ('_id', DESCENDING),
+        ])
 
     @staticmethod
     def migrate() -> None:
@@ -148,17 +690,33 @@ class Network:
         _m = 'Migrate {collection} collection OK.'
 
         try:
-            _db.interface.create_index({
-                'expireAfterSeconds': CONF.db_expire_time
-            })
+            Network.__samples(_db, 'interface', 'interface')
             _log.info(_m.format(collection='trafic'))
         except Exception as e:
             _log.error(e.args)
 
+        try:
+            _db.interface_rollup.create_indexes([
+                IndexModel([
+                    ('expire', ASCENDING)
+                ], expireAfterSeconds=0),
+                IndexModel([
+                    ('tier', ASCENDING),
+                    ('timestamp', ASCENDING),
+                ]),
+            ])
+            _log.info(_m.format(collection='interface_rollup'))
+        except Exception as e:
+            _log.error(e.args)
+
         try:
             _db.process.create_indexes([
                 IndexModel([
-                    ('expireAfterSeconds', CONF.db_expire_time)
+                    ('last_seen', ASCENDING)
+                ], expireAfterSeconds=CONF.connection_expire_time),
+                IndexModel([
+                    ('last_seen', DESCENDING),
+                    ('_id', DESCENDING),
                 ]),
                 IndexModel([
                     ('local_host', ASCENDING),
@@ -171,9 +729,87 @@ class Network:
             _log.error(e.args)
 
         try:
-            _db.package.create_index({
-                'expireAfterSeconds': CONF.db_expire_time
-            })
+            _db.connection_event.create_indexes([
+                IndexModel([
+                    ('date', ASCENDING)
+                ], expireAfterSeconds=CONF.db_expire_time),
+                IndexModel([
+                    ('timestamp', DESCENDING),
+                    ('_id', DESCENDING),
+                ]),
+                IndexModel([
+                    ('event', ASCENDING),
+                    ('timestamp', DESCENDING),
+                ]),
+            ])
+            _log.info(_m.format(collection='connection_event'))
+        except Exception as e:
+            _log.error(e.args)
+
+        try:
+            Network.__samples(_db, 'package', 'interface')
             _log.info(_m.format(collection='package'))
         except Exception as e:
             _log.error(e.args)
+
+        try:
+            _db.flow.create_indexes([
+                IndexModel([
+                    ('window', ASCENDING)
+                ], expireAfterSeconds=CONF.db_expire_time),
+                IndexModel([
+                    ('interface', ASCENDING),
+                    ('timestamp', DESCENDING),
+                ]),
+                IndexModel([
+                    ('timestamp', DESCENDING),
+                    ('_id', DESCENDING),
+                ]),
+            ])
+            _log.info(_m.format(collection='flow'))
+        except Exception as e:
+            _log.error(e.args)
+
+        try:
+            _db.capture_stats.create_indexes([
+                IndexModel([
+                    ('date', ASCENDING)
+                ], expireAfterSeconds=CONF.db_expire_time),
+                IndexModel([
+                    ('timestamp', DESCENDING),
+                    ('_id', DESCENDING),
+                ]),
+            ])
+            _log.info(_m.format(collection='capture_stats'))
+        except Exception as e:
+            _log.error(e.args)
+
+        try:
+            _db.top_talkers.create_indexes([
+                IndexModel([
+                    ('window', ASCENDING)
+                ], expireAfterSeconds=CONF.db_expire_time),
+                IndexModel([
+                    ('dimension', ASCENDING),
+                    ('metric', ASCENDING),
+                    ('timestamp', DESCENDING),
+                ]),
+            ])
+            _log.info(_m.format(collection='top_talkers'))
+        except Exception as e:
+            _log.error(e.args)
+
+        try:
+            _db.peer_sketch.create_indexes([
+                IndexModel([
+                    ('window', ASCENDING)
+                ], expireAfterSeconds=CONF.db_expire_time),
+                IndexModel([
+                    ('kind', ASCENDING),
+                    ('interface', ASCENDING),
+                    ('timestamp', DESCENDING),
+                ]),
+            ])
+            _log.info(_m.format(collection='peer_sketch'))
+        except Exception as e:
+            _log.error(e.args)
@@ -0,0 +1,371 @@
+import base64
+import json
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Tuple
+
+from settings.config import CONF
+
+_log = logging.getLogger(__name__)
+
+# Operadores de consulta aceitos, no formato do MongoDB.
+_OPERATORS = {
+    '$gt': '>',
+    '$gte': '>=',
+    '$lt': '<',
+    '$lte': '<=',
+    '$ne': '!=',
+}
+# Campos guardados em colunas indexadas. `date` é sempre igual ao timestamp.
+_COLUMNS = {
+    '_id': '_id',
+    'timestamp': 'timestamp',
+    'date': 'timestamp',
+}
+
+
+def timestamp(value: Any) -> Any:
+    """
+    Datas viram timestamps. Datas sem fuso, como as lidas de BSON, são UTC.
+    """
+    if not isinstance(value, datetime):
+        return value
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+
+    return value.timestamp()
+
+
+def locked(error: Exception) -> bool:
+    """
+    Diz se o erro é do banco travado por outra conexão, que passa sozinho.
+    """
+    return isinstance(error, sqlite3.OperationalError) and 'locked' in str(error)
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return timestamp(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return base64.b64encode(value).decode()
+
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def _field(name: str) -> str:
+    if name in _COLUMNS:
+        return _COLUMNS[name]
+
+    return "json_extract(doc, '$.\"%s\"')" % name.replace('"', '').replace("'", '')
+
+
+class _Fields(dict):
+    """
+    Campos das expressões de agregação, como `{pkg_len}`, em SQL.
+    """
+    def __missing__(self, name: str) -> str:
+        return _field(name)
+
+
+def where(query: Dict) -> Tuple[str, List[Any]]:
+    """
+    Traduz uma consulta no formato do MongoDB, com igualdade e os
+    operadores $gt, $gte, $lt, $lte, $ne, $in e $nin nos campos do primeiro
+    nível, para uma cláusula WHERE.
+    """
+    _clauses, _params = [], []
+
+    for _name, _cond in (query or {}).items():
+        _f = _field(_name)
+
+        if not isinstance(_cond, dict):
+            _clauses.append(f'{_f} = ?')
+            _params.append(timestamp(_cond))
+            continue
+
+        for _op, _v in _cond.items():
+            if _op in _OPERATORS:
+                _clauses.append(f'{_f} {_OPERATORS[_op]} ?')
+                _params.append(timestamp(_v))
+            elif _op in ('$in', '$nin'):
+                _v = [timestamp(i) for i in _v]
+                _not = 'NOT ' if _op == '$nin' else ''
+                _clauses.append(f'{_f} {_not}IN ({", ".join("?" * len(_v))})' if _v else ('1' if _not else '0'))
+                _params.extend(_v)
+            else:
+                raise ValueError(f'Unsupported operator {_op}')
+
+    return ' AND '.join(_clauses) or '1', _params
+
+
+def project(document: Dict, fields: Dict) -> Dict:
+    """
+    Aplica uma projeção no formato do MongoDB: só os campos marcados com 1,
+    mais o _id, ou todos menos os marcados com 0.
+    """
+    if not fields:
+        return document
+
+    if any(v for k, v in fields.items() if k != '_id'):
+        _keep = {k for k, v in fields.items() if v}
+
+        if fields.get('_id', 1):
+            _keep.add('_id')
+
+        return {k: v for k, v in document.items() if k in _keep}
+
+    return {k: v for k, v in document.items() if fields.get(k, 1)}
+
+
+class Collection:
+    """
+    Collection de documentos em uma tabela do SQLite.
+
+    O documento fica em JSON, com datas como timestamps e bytes em base64,
+    e o tempo, a expiração e a chave única ficam em colunas indexadas. As
+    consultas usam o mesmo formato de filtro do MongoDB.
+    """
+    def __init__(
+            self,
+            store: 'Store',
+            name: str,
+            time_field: str='timestamp',
+            expire: Callable[[Dict], float | None] | None=None,
+            key: Callable[[Dict], str] | None=None,
+        ) -> None:
+        self._store = store
+        self._name = name
+        self._time_field = time_field
+        self._key = key or (lambda d: None)
+        self._expire = expire or (lambda d: (self.__time(d) or time.time()) + CONF.db_expire_time)
+
+    def __time(self, document: Dict) -> float | None:
+        return timestamp(document.get(self._time_field))
+
+    def __row(self, document: Dict, key: str | None=None) -> Tuple:
+        return (
+            key or self._key(document),
+            self.__time(document),
+            self._expire(document),
+            json.dumps(document, default=_default),
+        )
+
+    def create(self, indexes: List[Tuple[str, ...]]=[]) -> None:
+        """
+        Cria a tabela, os índices de tempo e expiração e os índices das
+        expressões em `indexes`.
+        """
+        _c = self._store.connection
+        _c.execute(f'''
+            CREATE TABLE IF NOT EXISTS "{self._name}" (
+                _id INTEGER PRIMARY KEY,
+                key TEXT UNIQUE,
+                timestamp REAL,
+                expire REAL,
+                doc TEXT NOT NULL
+            )
+        ''')
+        _c.execute(f'CREATE INDEX IF NOT EXISTS "{self._name}_timestamp" ON "{self._name}" (timestamp)')
+        _c.execute(f'CREATE INDEX IF NOT EXISTS "{self._name}_expire" ON "{self._name}" (expire)')
+
+        for _i, _fields in enumerate(indexes):
+            _cols = ', '.join(_field(f) for f in _fields)
+            _c.execute(f'CREATE INDEX IF NOT EXISTS "{self._name}_{_i}" ON "{self._name}" ({_cols})')
+
+        _c.commit()
+
+    def insert_many(self, documents: List[Dict], keys: List[str] | None=None) -> int:
+        """
+        Insere o lote em uma única transação. Uma chave repetida desfaz a
+        transação com IntegrityError. Com `keys`, cada documento é gravado
+        com a sua chave da lista e os já gravados com ela são ignorados.
+        """
+        _keys = keys or [None] * len(documents)
+
+        with self._store.transaction() as _c:
+            _c.executemany(
+                f'INSERT {"OR IGNORE " if keys else ""}INTO "{self._name}" (key, timestamp, expire, doc) VALUES (?, ?, ?, ?)',
+                [self.__row(d, k) for d, k in zip(documents, _keys)],
+            )
+
+        self._store.prune(self._name)
+        return len(documents)
+
+    def upsert_many(self, documents: List[Dict], keep: Tuple[str, ...]=()) -> int:
+        """
+        Insere ou substitui os documentos pela chave, mantendo os campos de
+        `keep` do documento já gravado.
+        """
+        _doc = 'excluded.doc'
+
+        for _k in keep:
+            _path = f"'$.\"{_k}\"'"
+            _doc = f'json_set({_doc}, {_path}, json_extract(doc, {_path}))'
+
+        with self._store.transaction() as _c:
+            _c.executemany(
+                f'''INSERT INTO "{self._name}" (key, timestamp, expire, doc) VALUES (?, ?, ?, ?)
+                    ON CONFLICT(key) DO UPDATE SET
+                        timestamp = excluded.timestamp,
+                        expire = excluded.expire,
+                        doc = {_doc}''',
+                [self.__row(d) for d in documents],
+            )
+
+        self._store.prune(self._name)
+        return len(documents)
+
+    def update(self, query: Dict, values: Dict) -> int:
+        """
+        Altera campos dos documentos encontrados, como um $set.
+        """
+        _where, _params = where(query)
+        _set = ', '.join(f"'$.\"{k}\"', json(?)" for k in values)
+        _values = [json.dumps(v, default=_default) for v in values.values()]
+
+        with self._store.transaction() as _c:
+            return _c.execute(
+                f'UPDATE "{self._name}" SET doc = json_set(doc, {_set}) WHERE {_where}',
+                _values + _params,
+            ).rowcount
+
+    def delete(self, query: Dict) -> int:
+        _where, _params = where(query)
+
+        with self._store.transaction() as _c:
+            return _c.execute(f'DELETE FROM "{self._name}" WHERE {_where}', _params).rowcount
+
+    def find(
+            self,
+            query: Dict={},
+            fields: Dict={},
+            sort: List[Tuple[str, int]]=[],
+            limit: int | None=None,
+            skip: int=0,
+        ) -> List[Dict]:
+        _where, _params = where(query)
+        _sql = f'SELECT _id, doc FROM "{self._name}" WHERE {_where}'
+
+        if sort:
+            _sql += ' ORDER BY ' + ', '.join(f'{_field(f)} {"DESC" if d < 0 else "ASC"}' for f, d in sort)
+
+        if limit is not None or skip:
+            _sql += ' LIMIT ? OFFSET ?'
+            _params += [-1 if limit is None else limit, skip]
+
+        _response = []
+
+        for _id, _doc in self._store.connection.execute(_sql, _params):
+            _doc = json.loads(_doc)
+            _doc['_id'] = str(_id)
+            _response.append(project(_doc, fields))
+
+        return _response
+
+    def scan(
+            self,
+            query: Dict={},
+            fields: Dict={},
+            after: Tuple[float, int] | None=None,
+            ascending: bool=False,
+            limit: int=-1,
+        ) -> List[Tuple[Tuple[float, int], Dict]]:
+        """
+        Página na ordem de (tempo, _id) a partir da chave `after`, que usa
+        o índice do tempo. Cada documento vem com a sua chave.
+        """
+        _where, _params = where(query)
+        _order = 'ASC' if ascending else 'DESC'
+
+        if after is not None:
+            _where += f' AND (timestamp, _id) {">" if ascending else "<"} (?, ?)'
+            _params += list(after)
+
+        _sql = f'''SELECT timestamp, _id, doc FROM "{self._name}" WHERE {_where}
+                   ORDER BY timestamp {_order}, _id {_order} LIMIT ?'''
+        _response = []
+
+        for _time, _id, _doc in self._store.connection.execute(_sql, _params + [limit]):
+            _doc = json.loads(_doc)
+            _doc['_id'] = str(_id)
+            _response.append(((_time, _id), project(_doc, fields)))
+
+        return _response
+
+    def series(self, key: str, step: float, query: Dict, columns: Dict[str, str], limit: int=-1) -> List[Dict]:
+        """
+        Agrupa os documentos por `key` e pelo início do intervalo de `step`
+        segundos. `columns` liga o nome de cada valor à sua expressão de
+        agregação, com os campos entre chaves, como em `AVG({pkg_len})`. Um
+        ponto no nome aninha o valor: `pkg_len.avg`.
+        """
+        _where, _params = where(query)
+        _columns = ', '.join(c.format_map(_Fields()) for c in columns.values())
+        _sql = f'''SELECT {_field(key)}, CAST(timestamp / ? AS INTEGER) * ?, {_columns}
+                   FROM "{self._name}" WHERE {_where} GROUP BY 1, 2 ORDER BY 2, 1 LIMIT ?'''
+        _response = []
+
+        for _row in self._store.connection.execute(_sql, [step, step] + _params + [limit]):
+            _point = {key: _row[0], 'timestamp': _row[1]}
+
+            for _name, _value in zip(columns, _row[2:]):
+                _parent, _, _child = _name.rpartition('.')
+                (_point.setdefault(_parent, {}) if _parent else _point)[_child] = _value
+
+            _response.append(_point)
+
+        return _response
+
+    def find_one(self, query: Dict={}, fields: Dict={}, sort: List[Tuple[str, int]]=[]) -> Dict | None:
+        _found = self.find(query, fields, sort, 1)
+        return _found[0] if _found else None
+
+
+class Store:
+    """
+    Banco SQLite embarcado, compartilhado entre os processos.
+
+    Usa WAL, então a API lê enquanto os daemons gravam, e cada thread tem a
+    sua conexão. Os dados vencidos são apagados no máximo uma vez a cada
+    `prune_interval` segundos por tabela, junto com as gravações.
+    """
+    def __init__(self, path: str=CONF.sqlite_path, prune_interval: int=CONF.sqlite_prune_interval) -> None:
+        self._path = path
+        self._prune_interval = prune_interval
+        self._pruned: Dict[str, float] = {}
+        self._local = threading.local()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        _c = getattr(self._local, 'connection', None)
+
+        if _c is None:
+            _c = self._local.connection = sqlite3.connect(self._path, timeout=30)
+            _c.execute('PRAGMA journal_mode=WAL')
+            _c.execute('PRAGMA synchronous=NORMAL')
+
+        return _c
+
+    def transaction(self) -> sqlite3.Connection:
+        """
+        A conexão como gerenciador de contexto: commit ao fim do bloco e
+        rollback em caso de erro.
+        """
+        return self.connection
+
+    def prune(self, name: str) -> None:
+        _now = time.time()
+
+        if _now - self._pruned.get(name, 0) < self._prune_interval:
+            return
+
+        self._pruned[name] = _now
+
+        with self.transaction() as _c:
+            _deleted = _c.execute(f'DELETE FROM "{name}" WHERE expire < ?', (_now,)).rowcount
+
+        if _deleted:
+            _log.info('Pruned %s expired %s', _deleted, name)
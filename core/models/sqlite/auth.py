@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import sqlite3
+from typing import Dict, List, Tuple
+
+from core.models.sqlite import Collection, Store
+from settings.config import CONF
+
+_log = logging.getLogger(__name__)
+
+
+class Auth:
+    """
+    Usuários e tokens gravados no SQLite, com a mesma interface do modelo
+    do MongoDB. Nenhum dos dois expira.
+    """
+    _store = Store()
+    _user = Collection(_store, 'user', expire=lambda d: None, key=lambda d: d['username'])
+    _token = Collection(_store, 'token', expire=lambda d: None, key=lambda d: d['user'])
+
+    async def set_user(self, user: Dict) -> str | None:
+        """
+        Seta um novo usuário no banco de dados.
+        """
+        if not isinstance(user, dict) or not user:
+            _log.error('Invalid user content.')
+            return
+
+        def _insert() -> str:
+            self._user.insert_many([user])
+            return self._user.find_one({'username': user['username']})['_id']
+
+        try:
+            _id = await asyncio.to_thread(_insert)
+        except sqlite3.IntegrityError as e:
+            _log.warning('The user %s already exists in the system', user['username'])
+            raise e
+        except Exception as e:
+            _log.error(e.args)
+            raise e
+        else:
+            _log.info('Created user %s', _id)
+            return _id
+
+    async def get_user(
+            self,
+            query: Dict={},
+            fields: Dict={},
+            sort: List[Tuple[str, int]]=[],
+        ) -> List[Dict]:
+        """
+        Recupera usuários do banco de dados.
+        """
+        if query and not isinstance(query, dict):
+            _log.debug('Invalid query content.')
+            return
+        elif fields and not isinstance(fields, dict):
+            _log.debug('Invalid filter content.')
+            return
+
+        return await asyncio.to_thread(self._user.find, query, fields, sort, limit=CONF.db_response_limit)
+
+    async def change_user(self, user: Dict) -> str | None:
+        """
+        Muda um usuário no banco de dados.
+        """
+        if not user or not isinstance(user, dict):
+            _log.warning('Invalid user content.')
+            return
+
+        _values = {k: v for k, v in user.items() if k != '_id'}
+
+        try:
+            await asyncio.to_thread(self._user.update, {'username': user['username']}, _values)
+            _log.info('Changed user %s', user['username'])
+        except Exception as e:
+            _log.error(e.args)
+
+    async def get_token(self, user_id: str) -> str | None:
+        """
+        Recupera o token do banco de dados.
+        """
+        if not isinstance(user_id, str):
+            _log.debug('Invalid token!')
+            return
+
+        try:
+            _response = await asyncio.to_thread(self._token.find_one, {'user': user_id})
+        except Exception as e:
+            _log.error(e.args)
+            return
+
+        return _response['token'] if _response else None
+
+    async def set_token(self, token: str, user_id: str) -> None:
+        """
+        Insere ou troca o token do usuário.
+        """
+        if not isinstance(token, str):
+            return
+
+        try:
+            await asyncio.to_thread(self._token.upsert_many, [{
+                'token': token,
+                'user': user_id,
+            }])
+            _log.debug('Inserted token for %s', user_id)
+        except Exception as e:
+            _log.error(e.args)
+
+    async def find_one(self, username: str) -> Dict | None:
+        return await asyncio.to_thread(self._user.find_one, {'username': username})
+
+    async def remove_one(self, username: str) -> int | None:
+        """
+        Remove um usuário.
+        """
+        try:
+            _response = await asyncio.to_thread(self._user.delete, {'username': username})
+            _log.debug('User %s removed. (%s)' % (username, _response))
+            return _response
+        except Exception as e:
+            _log.error(e.args)
+            raise e
+
+    @staticmethod
+    def migrate() -> None:
+        """
+        Cria as tabelas de usuários e tokens e o usuário admin.
+        """
+        _m = 'Migrate {collection} collection OK.'
+
+        try:
+            Auth._user.create()
+            Auth._token.create()
+            _log.info(_m.format(collection='auth'))
+            from core.utils import AuthHash
+            Auth._user.insert_many([{
+                'username': 'admin',
+                'password': AuthHash.password_hash('admin'),
+            }])
+        except Exception as e:
+            _log.error(e.args)
@@ -0,0 +1,467 @@
+import asyncio
+import base64
+import logging
+import time
+from typing import AsyncIterator, Dict, List, Tuple
+
+from core.models.sqlite import Collection, Store, locked, timestamp
+from core.utils.sketch import HyperLogLog, SpaceSaving
+from settings.config import CONF
+
+_log = logging.getLogger(__name__)
+
+
+class Network:
+    """
+    Modelo da rede gravado no SQLite, com a mesma interface do modelo do
+    MongoDB. As consultas rodam em uma thread para não travar o event loop.
+    """
+    _store = Store()
+    _collections = {
+        'interface': Collection(_store, 'interface'),
+        'interface_rollup': Collection(_store, 'interface_rollup', expire=lambda d: timestamp(d['expire'])),
+        'process': Collection(
+            _store,
+            'process',
+            time_field='last_seen',
+            expire=lambda d: d['last_seen'] + CONF.connection_expire_time,
+            key=lambda d: f'{d["local_host"]}|{d["remote_host"]}|{d["pid"]}',
+        ),
+        'connection_event': Collection(_store, 'connection_event'),
+        'package': Collection(_store, 'package'),
+        'flow': Collection(_store, 'flow'),
+        'capture_stats': Collection(_store, 'capture_stats'),
+        'top_talkers': Collection(_store, 'top_talkers'),
+        'peer_sketch': Collection(_store, 'peer_sketch'),
+    }
+
+    def __insert(self, collection: str, documents: List[Dict]) -> List[int]:
+        """
+        Insere um lote em uma transação. Devolve os índices recusados, que
+        são todos quando a transação falha.
+        """
+        if not isinstance(documents, (list, tuple)) or not documents:
+            _log.debug('Invalid %s content.', collection)
+            return []
+
+        try:
+            self._collections[collection].insert_many(documents)
+        except Exception as e:
+            _log.error(e.args)
+            return list(range(len(documents)))
+
+        _log.info('Insert %s %s', len(documents), collection)
+        return []
+
+    async def __find(self, collection: str, query: Dict={}, fields: Dict={}, **kwargs) -> List[Dict]:
+        if query and not isinstance(query, dict):
+            _log.error('Invalid query content.')
+            return
+        elif fields and not isinstance(fields, dict):
+            _log.debug('Invalid filter content.')
+            return
+
+        return await asyncio.to_thread(self._collections[collection].find, query, fields, **kwargs)
+
+    async def set_interfaces(self, interfaces: List[Dict]) -> None:
+        await asyncio.to_thread(self.__insert, 'interface', interfaces)
+
+    async def set_interface_rollups(self, rollups: List[Dict]) -> None:
+        await asyncio.to_thread(self.__insert, 'interface_rollup', rollups)
+
+    async def get_interface_rollups(
+            self,
+            tier: int,
+            start: float,
+            end: float,
+            query: Dict={},
+            fields: Dict={},
+            limit: int=CONF.db_response_limit,
+        ) -> List[Dict]:
+        _query = dict(query, tier=tier, timestamp={'$gte': start, '$lt': end})
+        _response = await self.__find(
+            'interface_rollup',
+            _query,
+            fields or {'window': 0, 'expire': 0},
+            sort=[('timestamp', -1)],
+            limit=limit,
+        )
+
+        return list(reversed(_response or []))
+
+    async def get_interfaces(
+            self,
+            query: Dict={},
+            fields: Dict={},
+            sort: List[Tuple[str, int]]=[],
+        ) -> List[Dict]:
+        _response = await self.__find(
+            'interface',
+            query,
+            fields,
+            sort=sort or [('timestamp', -1)],
+            limit=CONF.db_response_limit,
+        )
+
+        return [self.__document('interface', r) for r in _response or []]
+
+    async def set_connections(self, connections: List[Dict], closed: List[Dict]=[]) -> None:
+        """
+        Atualiza o estado das conexões, mantendo o `first_seen` das que já
+        existem. As fechadas ficam com o status "CLOSE" até expirarem.
+        """
+        if not isinstance(connections, (list, tuple)) or not isinstance(closed, (list, tuple)):
+            _log.debug('Invalid connection content.')
+            return
+
+        _now = time.time()
+        _process = self._collections['process']
+
+        def _write() -> None:
+            if connections:
+                _process.upsert_many([{
+                    'local_host': c['local_host'],
+                    'remote_host': c['remote_host'],
+                    'pid': c['pid'],
+                    'status': c['status'],
+                    'name': c.get('name'),
+                    'exe': c.get('exe'),
+                    'username': c.get('username'),
+                    'cmdline': c.get('cmdline'),
+                    'first_seen': _now,
+                    'last_seen': _now,
+                } for c in connections], keep=('first_seen',))
+
+            for c in closed:
+                _process.update({
+                    'local_host': c['local_host'],
+                    'remote_host': c['remote_host'],
+                    'pid': c['pid'],
+                }, {'status': 'CLOSE'})
+
+        try:
+            await asyncio.to_thread(_write)
+        except Exception as e:
+            _log.error(e.args)
+
+    async def set_connection_events(self, events: List[Dict]) -> None:
+        await asyncio.to_thread(self.__insert, 'connection_event', events)
+
+    async def get_connection_events(
+            self,
+            query: Dict={},
+            fields: Dict={},
+            sort: List[Tuple[str, int]]=[],
+        ) -> List[Dict]:
+        _response = await self.__find(
+            'connection_event',
+            query,
+            fields,
+            sort=sort or [('timestamp', -1)],
+            limit=CONF.db_response_limit,
+        )
+
+        return [self.__document('connection_event', r) for r in _response or []]
+
+    async def get_processes(
+            self,
+            query: Dict={},
+            fields: Dict={},
+            sort: List[Tuple[str, int]]=[],
+        ) -> List[Dict]:
+        return await self.__find(
+            'process',
+            query,
+            fields,
+            sort=sort or [('last_seen', -1)],
+            limit=CONF.db_response_limit,
+        )
+
+    def set_package(self, package: Dict) -> None:
+        if not isinstance(package, dict) or not package:
+            _log.debug('Invalid package content.\nContent: %s' % str(package))
+            return
+
+        self.set_packages([package])
+
+    def set_packages(self, packages: List[Dict]) -> List[int]:
+        return self.__insert('package', packages)
+
+    def set_flows(self, flows: List[Dict]) -> List[int]:
+        return self.__insert('flow', flows)
+
+    def set_capture_stats(self, stats: List[Dict]) -> List[int]:
+        return self.__insert('capture_stats', stats)
+
+    def set_top_talkers(self, snapshots: List[Dict]) -> List[int]:
+        return self.__insert('top_talkers', snapshots)
+
+    def set_peer_sketches(self, sketches: List[Dict]) -> List[int]:
+        return self.__insert('peer_sketch', sketches)
+
+    def insert_spooled(self, collection: str, documents: List[Dict]) -> bool:
+        """
+        Grava um lote vindo do spool. Só devolve falso quando o banco está
+        travado, para que o lote seja tentado de novo. O _id do spool vira
+        a chave do documento, então as cópias de uma nova tentativa são
+        ignoradas. Se o lote for recusado, os documentos são gravados um a
+        um e os recusados não voltam para o spool.
+        """
+        _collection = self._collections[collection]
+        _keys = [str(d['_id']) if '_id' in d else None for d in documents]
+        _docs = [{k: v for k, v in d.items() if k != '_id'} for d in documents]
+
+        try:
+            _collection.insert_many(_docs, _keys)
+        except Exception as e:
+            if locked(e):
+                _log.warning('Database unavailable, keeping %s %s in the spool: %s', len(documents), collection, e)
+                return False
+
+            _errors = []
+
+            for _d, _k in zip(_docs, _keys):
+                try:
+                    _collection.insert_many([_d], [_k])
+                except Exception as e:
+                    # Travado no meio: o lote volta inteiro, as cópias são ignoradas.
+                    if locked(e):
+                        return False
+
+                    _errors.append(e)
+
+            _log.error('Insert %s partially failed: %s', collection, [e.args for e in _errors[:1]])
+        else:
+            _log.info('Insert %s %s from spool', len(documents), collection)
+
+        return True
+
+    async def get_packages(
+            self,
+            query: Dict={},
+            fields: Dict={},
+            sort: List[Tuple[str, int]]=[],
+        ) -> List[Dict]:
+        _response = await self.__find('package', query, fields, sort=sort, limit=CONF.db_response_limit)
+
+        return [self.__document('package', r) for r in _response or []]
+
+    async def get_flows(
+            self,
+            query: Dict={},
+            fields: Dict={},
+            sort: List[Tuple[str, int]]=[],
+        ) -> List[Dict]:
+        return await self.__find(
+            'flow',
+            query,
+            fields,
+            sort=sort or [('timestamp', -1)],
+            limit=CONF.db_response_limit,
+        )
+
+    async def get_capture_stats(
+            self,
+            query: Dict={},
+            fields: Dict={},
+            sort: List[Tuple[str, int]]=[],
+        ) -> List[Dict]:
+        _response = await self.__find(
+            'capture_stats',
+            query,
+            fields,
+            sort=sort or [('timestamp', -1)],
+            limit=CONF.db_response_limit,
+        )
+
+        return [self.__document('capture_stats', r) for r in _response or []]
+
+    async def scan(
+            self,
+            collection: str,
+            time_field: str,
+            query: Dict={},
+            fields: Dict={},
+            after: Tuple[float, str] | None=None,
+            ascending: bool=False,
+            limit: int | None=None,
+        ) -> AsyncIterator[Dict]:
+        """
+        Percorre a collection na ordem de (tempo, _id), a partir da chave
+        `after`, em páginas de `streamBatchSize` documentos. O tempo de cada
+        tabela já fica na coluna indexada, então `time_field` não é usado.
+        """
+        if after is not None:
+            try:
+                after = (float(after[0]), int(after[1]))
+            except (TypeError, ValueError):
+                raise ValueError('Invalid cursor!')
+
+        _collection = self._collections[collection]
+
+        while limit is None or limit > 0:
+            _size = CONF.stream_batch_size if limit is None else min(limit, CONF.stream_batch_size)
+            _page = await asyncio.to_thread(_collection.scan, query, fields, after, ascending, _size)
+
+            for _, _doc in _page:
+                yield self.__document(collection, _doc)
+
+            if len(_page) < _size:
+                return
+
+            after = _page[-1][0]
+
+            if limit is not None:
+                limit -= _size
+
+    @staticmethod
+    def __document(collection: str, document: Dict) -> Dict:
+        """
+        Converte um documento do banco para a resposta da API.
+        """
+        document.pop('date', None)
+
+        # Cada pacote amostrado representa `sampling_rate` pacotes.
+        if collection == 'package' and 'sampling_rate' in document:
+            document['estimated_packets'] = document['sampling_rate']
+
+            if 'pkg_len' in document:
+                document['estimated_bytes'] = document['pkg_len'] * document['sampling_rate']
+
+        return document
+
+    async def get_interface_series(
+            self,
+            start: float,
+            end: float,
+            step: float,
+            query: Dict={},
+            limit: int=CONF.page_max_limit,
+        ) -> List[Dict]:
+        _columns = {'samples': 'COUNT(*)'}
+
+        for _m in ('upload_speed', 'download_speed'):
+            for _agg in ('min', 'max', 'avg'):
+                _columns[f'{_m}.{_agg}'] = f'{_agg.upper()}({{{_m}}})'
+
+        return await asyncio.to_thread(
+            self._collections['interface'].series,
+            'interface',
+            step,
+            dict(query, timestamp={'$gte': start, '$lt': end}),
+            _columns,
+            limit,
+        )
+
+    async def get_package_series(
+            self,
+            start: float,
+            end: float,
+            step: float,
+            key: str='interface',
+            query: Dict={},
+            limit: int=CONF.page_max_limit,
+        ) -> List[Dict]:
+        _columns = {
+            'samples': 'COUNT(*)',
+            'estimated_packets': 'SUM(IFNULL({sampling_rate}, 1))',
+            'estimated_bytes': 'SUM({pkg_len} * IFNULL({sampling_rate}, 1))',
+            'pkg_len.min': 'MIN({pkg_len})',
+            'pkg_len.max': 'MAX({pkg_len})',
+            'pkg_len.avg': 'AVG({pkg_len})',
+        }
+
+        return await asyncio.to_thread(
+            self._collections['package'].series,
+            key,
+            step,
+            dict(query, timestamp={'$gte': start, '$lt': end}),
+            _columns,
+            limit,
+        )
+
+    async def get_top_talkers(self, dimension: str, metric: str, k: int=10, windows: int=1) -> List[Dict]:
+        """
+        Soma os sketches das últimas `windows` janelas e devolve os k
+        maiores itens.
+        """
+        _query = {'dimension': dimension, 'metric': metric}
+        _top_talkers = self._collections['top_talkers']
+        _last = await asyncio.to_thread(_top_talkers.find_one, _query, {'timestamp': 1}, [('timestamp', -1)])
+
+        if not _last:
+            return []
+
+        _query['timestamp'] = {'$gt': _last['timestamp'] - windows * CONF.top_window}
+        _snapshots = await asyncio.to_thread(_top_talkers.find, _query, {'items': 1, 'minimum': 1})
+
+        return [{
+            'key': _key,
+            metric: _value,
+            'error': _error,
+        } for _key, _value, _error in SpaceSaving.merge(_snapshots, k)]
+
+    async def get_distinct_peers(
+            self,
+            kind: str,
+            start: float,
+            end: float,
+            interface: str | None=None,
+        ) -> Dict:
+        """
+        Combina os HyperLogLog das janelas iniciadas entre `start` e `end`.
+        """
+        _query = {
+            'kind': kind,
+            'timestamp': {'$gte': start, '$lt': end},
+        }
+
+        if interface:
+            _query['interface'] = interface
+
+        _hll = None
+        _docs = await asyncio.to_thread(
+            self._collections['peer_sketch'].find,
+            _query,
+            {'registers': 1, 'precision': 1},
+        )
+
+        for _doc in _docs:
+            _sketch = HyperLogLog.from_bytes(base64.b64decode(_doc['registers']), _doc['precision'])
+
+            if _hll is None:
+                _hll = _sketch
+            else:
+                _hll.merge(_sketch)
+
+        return {
+            'interface': interface,
+            'kind': kind,
+            'start': start,
+            'end': end,
+            'buckets': len(_docs),
+            'distinct': _hll.count() if _hll else 0,
+        }
+
+    @staticmethod
+    def migrate() -> None:
+        """
+        Cria as tabelas e os índices das consultas.
+        """
+        _m = 'Migrate {collection} collection OK.'
+        _indexes = {
+            'interface': [('interface', 'timestamp')],
+            'interface_rollup': [('tier', 'timestamp')],
+            'process': [('local_host', 'remote_host', 'pid')],
+            'connection_event': [('event', 'timestamp')],
+            'flow': [('interface', 'timestamp')],
+            'top_talkers': [('dimension', 'metric', 'timestamp')],
+            'peer_sketch': [('kind', 'interface', 'timestamp')],
+        }
+
+        for _name, _collection in Network._collections.items():
+            try:
+                _collection.create(_indexes.get(_name, []))
+                _log.info(_m.format(collection=_name))
+            except Exception as e:
+                _log.error(e.args)
@@ -1,14 +1,21 @@
+import base64
+import binascii
+import json
 import logging
+from contextlib import aclosing
 from datetime import datetime, timedelta
 from hashlib import pbkdf2_hmac
-from typing import Any, Dict, List
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Tuple
+from urllib.parse import urlencode
 
 import jwt
-import pandas as pd
+from tornado.escape import json_encode
+from tornado.iostream import StreamClosedError
 from tornado.web import RequestHandler
 
-from core.models.auth import Auth as AuthModel
-from core.utils import errors
+from core import models
+from core.utils import errors, query
+from core.utils.cache import ResponseCache
 from settings.config import CONF
 
 _log = logging.getLogger(__name__)
@@ -67,6 +74,13 @@ class AuthHash:
 
 class BaseHandler(RequestHandler):
     info: dict = {}
+    _params: List[str] = []  # Parâmetros de controle, que não são filtros.
+    _page_params: List[str] = ['limit', 'cursor', 'stream']  # Parâmetros da paginação.
+    _streams = {
+        'json': 'application/json; charset=UTF-8',
+        'ndjson': 'application/x-ndjson',
+    }
+    _cache = ResponseCache()
 
     def is_root_user(self) -> bool:
         """
@@ -96,55 +110,179 @@ class BaseHandler(RequestHandler):
             return False
         return True
 
-    def get_filters(self) -> Dict:
-        _filters = {}
+    def get_query(self, schema: Dict[str, Callable[[str], Any]]) -> Tuple[Dict, List[Tuple[str, int]]]:
+        """
+        Consulta e ordenação dos filtros da query string, para serem
+        executadas no banco. Levanta InvalidFilter com um filtro inválido.
+        """
+        try:
+            return query.parse(self.request.query_arguments, schema, self._params + self._page_params + ['fields'])
+        except (ValueError, UnicodeDecodeError) as e:
+            _log.debug(e.args)
+            raise errors.InvalidFilter('Invalid filter!')
 
-        if self.request.query:
-            _ands = self.request.query.split('&')
+    def get_fields(self, schema: Dict[str, Callable[[str], Any]]) -> Dict:
+        """
+        Projeção do parâmetro `fields`, vazia quando ele não foi passado.
+        Levanta InvalidFilter com um campo fora do `schema`.
+        """
+        try:
+            return query.projection(self.get_argument('fields', ''), schema)
+        except ValueError as e:
+            _log.debug(e.args)
+            raise errors.InvalidFilter('Invalid fields!')
 
-            for _and in _ands:
-                try:
-                    _k, _v = _and.split('=')
-                    _filters[_k] = _v
-                except Exception as e:
-                    self.finish({'error': 'Invalid filter!'})
-                    raise e
+    def data_response(self, data: List[Dict]) -> Dict:
+        """
+        Retorna um dicionário com os dados e a quantidade deles.
+        """
+        return {
+            'data': data,
+            'total': len(data),
+            'count': len(data),
+        }
 
-        return _filters
+    def get_page(self, time_field: str, sort: List[Tuple[str, int]]) -> Tuple[int | None, Tuple | None, bool] | None:
+        """
+        Limite, chave de início e direção da paginação, ou None se nenhum
+        parâmetro de paginação foi passado. A ordem é sempre a do tempo,
+        então `sort` só pode ser o campo de tempo. Levanta InvalidFilter.
+        """
+        if not any(p in self.request.query_arguments for p in self._page_params):
+            return None
+
+        _stream = self.get_argument('stream', None)
+
+        if _stream is not None and _stream not in self._streams:
+            raise errors.InvalidFilter('Invalid stream!')
+        if sort and (len(sort) > 1 or sort[0][0] != time_field):
+            raise errors.InvalidFilter('Invalid sort for pagination!')
 
-    def data_filter(self, data: List[Dict], filters: Dict={}) -> Dict:
+        try:
+            _limit = self.get_argument('limit', None)
+            _limit = int(_limit) if _limit is not None else None
+            _cursor = self.get_argument('cursor', None)
+            _after = json.loads(base64.urlsafe_b64decode(_cursor)) if _cursor else None
+        except (ValueError, binascii.Error) as e:
+            _log.debug(e.args)
+            raise errors.InvalidFilter('Invalid cursor!')
+
+        # Sem `stream` a página fica em memória, então o limite é obrigatório.
+        if _limit is None and not _stream:
+            _limit = CONF.db_response_limit
+        if _limit is not None and (_limit < 1 or (not _stream and _limit > CONF.page_max_limit)):
+            raise errors.InvalidFilter('Invalid limit!')
+        if _after is not None and not (
+                isinstance(_after, list)
+                and len(_after) == 2
+                and isinstance(_after[0], (int, float))
+                and isinstance(_after[1], str)):
+            raise errors.InvalidFilter('Invalid cursor!')
+
+        return _limit, tuple(_after) if _after else None, bool(sort) and sort[0][1] > 0
+
+    async def write_page(
+            self,
+            model: Any,
+            collection: str,
+            time_field: str,
+            query: Dict,
+            page: Tuple[int | None, Tuple | None, bool],
+            fields: Dict={},
+        ) -> None:
         """
-        Retorna um dicionário com o 
+        Responde com uma página e o cursor (`next`) da seguinte, que é nulo
+        na última. Com `stream`, envia os documentos conforme saem do banco.
         """
-        if not isinstance(filters, dict) or not isinstance(data, list):
-            self.set_status(status_code=400)
-            _log.debug('Invalid filter!')
-            return { 'error': 'Invalid filter!' }
-
-        _response = {}
-        _df = pd.DataFrame(data)
-        _keys = filters.keys()
-        _total = len(data)
-
-        if filters:
-            try:
-                for k in _keys:
-                    _df = _df.loc[_df[k] == filters[k]]
-            except KeyError:
-                _log.debug('Invalid filter!')
-                return { 'error': 'Invalid filter!' }
-            except Exception as e:
-                _log.error(e)
-                return { 'error': 'Invalid filter!' }
-
-            _response['data'] = _df.to_dict('records')
-        else:
-            _response['data'] = data
-    
-        _response['total'] = _total
-        _response['count'] = len(_df)
-
-        return _response
+        _limit, _after, _ascending = page
+        _stream = self.get_argument('stream', None)
+
+        # O cursor sai do último documento, então a página sempre traz a chave.
+        if fields and not _stream:
+            fields = dict(fields, **{time_field: 1, '_id': 1})
+
+        def _scan() -> AsyncIterator[Dict]:
+            return model.scan(collection, time_field, query, fields, _after, _ascending, _limit)
+
+        async def _page() -> Dict:
+            async with aclosing(_scan()) as _documents:
+                _data = [d async for d in _documents]
+
+            _response = self.data_response(_data)
+            _response['next'] = None
+
+            if _limit and len(_data) == _limit and time_field in _data[-1] and '_id' in _data[-1]:
+                _key = json.dumps([_data[-1][time_field], _data[-1]['_id']])
+                _response['next'] = base64.urlsafe_b64encode(_key.encode()).decode()
+
+            return _response
+
+        try:
+            if _stream:
+                async with aclosing(_scan()) as _documents:
+                    await self.__stream(_documents, _stream)
+            else:
+                await self.finish_cached(_page)
+        except ValueError as e:
+            # Cursor de outra collection ou de outro banco.
+            self.set_status(400)
+            self.finish({
+                'error': e.args,
+            })
+
+    async def finish_cached(self, produce: Callable[[], Awaitable[Dict]]) -> None:
+        """
+        Responde com o JSON de `produce`, guardado no cache de respostas
+        pela rota e pelos parâmetros da requisição.
+        """
+        _args = urlencode(sorted(self.request.query_arguments.items()), doseq=True)
+        _body = await self._cache.get(f'{self.request.path}?{_args}', produce)
+        self.set_status(200)
+        self.set_header('Content-Type', 'application/json; charset=UTF-8')
+        self.finish(_body)
+
+    async def __stream(self, documents: AsyncIterator[Dict], kind: str) -> None:
+        """
+        Escreve os documentos como um array JSON ou NDJSON em partes de
+        `streamBatchSize`, liberando cada parte para o cliente.
+        """
+        _ndjson = kind == 'ndjson'
+        _chunk, _written = [], 0
+
+        self.set_status(200)
+        self.set_header('Content-Type', self._streams[kind])
+
+        try:
+            async for _doc in documents:
+                _chunk.append(json_encode(_doc))
+
+                if len(_chunk) >= CONF.stream_batch_size:
+                    self.write(self.__chunk(_chunk, _ndjson, not _written))
+                    _written += len(_chunk)
+                    _chunk = []
+                    await self.flush()
+        except StreamClosedError:
+            _log.debug('Client closed the stream.')
+            return
+        except Exception as e:
+            if not _written:
+                raise e
+
+            # O status já foi enviado: a resposta termina incompleta.
+            _log.error('Stream interrupted after %s documents: %s', _written, e)
+            self.finish()
+            return
+
+        self.finish(self.__chunk(_chunk, _ndjson, not _written) + ('' if _ndjson else ']'))
+
+    @staticmethod
+    def __chunk(items: List[str], ndjson: bool, first: bool) -> str:
+        if ndjson:
+            return ''.join(f'{i}\n' for i in items)
+        if first:
+            return '[' + ','.join(items)
+
+        return ''.join(f',{i}' for i in items)
 
     async def __login_validation(self) -> Exception | None:
         """
@@ -177,7 +315,7 @@ class BaseHandler(RequestHandler):
             raise errors.InvalidToken('Invalid token!')
 
         try:
-            _model = AuthModel()
+            _model = models.Auth()
             _user = await _model.find_one(username=_tkn['username'])
         except KeyError:
             _msg = 'Token required field not found.'
@@ -0,0 +1,91 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Tuple
+
+from tornado.escape import json_encode
+
+from settings.config import CONF
+
+
+class ResponseCache:
+    """
+    Cache em memória das respostas da API, já serializadas em JSON.
+
+    Os dados só mudam a cada ciclo dos coletores, então as entradas vencem
+    juntas no próximo múltiplo de `ttl` do relógio e nenhuma resposta fica
+    mais velha que um ciclo. O cache é limitado pela quantidade de entradas
+    e pelo total de bytes, descartando as usadas há mais tempo. Requisições
+    iguais ao mesmo tempo esperam pela mesma consulta ao banco.
+    """
+    def __init__(
+            self,
+            ttl: float=CONF.refresh_time,
+            max_entries: int=CONF.response_cache_entries,
+            max_bytes: int=CONF.response_cache_bytes,
+        ) -> None:
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._entries: OrderedDict[str, Tuple[float, bytes]] = OrderedDict()
+        self._size = 0
+        self._expire = 0.0
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    async def get(self, key: str, produce: Callable[[], Awaitable[Dict]]) -> bytes:
+        """
+        Resposta guardada em `key` ou, se não houver, a de `produce`.
+        """
+        if self._ttl <= 0 or self._max_entries <= 0:
+            return json_encode(await produce()).encode()
+
+        _now = time.time()
+        _entry = self._entries.get(key)
+
+        if _entry is not None and _entry[0] > _now:
+            self._entries.move_to_end(key)
+            return _entry[1]
+
+        _pending = self._pending.get(key)
+
+        if _pending is None:
+            # A consulta roda em uma tarefa própria: se quem a iniciou for
+            # cancelado, os demais continuam esperando pelo mesmo resultado.
+            _pending = self._pending[key] = asyncio.ensure_future(self.__produce(key, produce))
+            _pending.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+        return await asyncio.shield(_pending)
+
+    async def __produce(self, key: str, produce: Callable[[], Awaitable[Dict]]) -> bytes:
+        _now = time.time()
+
+        try:
+            _body = json_encode(await produce()).encode()
+        finally:
+            del self._pending[key]
+
+        self.__store(key, (_now // self._ttl + 1) * self._ttl, _body)
+
+        return _body
+
+    def __store(self, key: str, expire: float, body: bytes) -> None:
+        # Um novo ciclo: tudo o que estava guardado já venceu.
+        if expire > self._expire:
+            self._entries.clear()
+            self._size = 0
+            self._expire = expire
+
+        if len(body) > self._max_bytes:
+            return
+
+        _old = self._entries.pop(key, None)
+
+        if _old is not None:
+            self._size -= len(_old[1])
+
+        self._entries[key] = (expire, body)
+        self._size += len(body)
+
+        while len(self._entries) > self._max_entries or self._size > self._max_bytes:
+            _, (_, _evicted) = self._entries.popitem(last=False)
+            self._size -= len(_evicted)
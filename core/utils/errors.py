@@ -7,3 +7,6 @@ class InvalidToken(Exception):  # Token invalido.
 class InvaliUser(Exception):  # Usuário inválido.
     pass
 
+
+class InvalidFilter(Exception):  # Filtro da query string inválido.
+    pass
@@ -0,0 +1,128 @@
+import operator
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Tuple
+
+# Sufixos aceitos nos filtros, como em `timestamp__gte=...`.
+_OPERATORS = ('gt', 'gte', 'lt', 'lte', 'ne', 'in', 'nin')
+_COMPARE = {
+    '$gt': operator.gt,
+    '$gte': operator.ge,
+    '$lt': operator.lt,
+    '$lte': operator.le,
+    '$ne': operator.ne,
+}
+
+
+def date(value: str) -> datetime:
+    """
+    Timestamp da query string para os campos gravados como data.
+    """
+    return datetime.fromtimestamp(float(value), timezone.utc)
+
+
+def parse(
+        arguments: Dict[str, List[bytes]],
+        schema: Dict[str, Callable[[str], Any]],
+        ignore: List[str]=[],
+    ) -> Tuple[Dict, List[Tuple[str, int]]]:
+    """
+    Traduz os argumentos da query string em uma consulta e uma ordenação
+    no formato do MongoDB.
+
+    `campo=valor` é igualdade e `campo__op=valor` usa um dos operadores
+    gt, gte, lt, lte, ne, in e nin, com os valores de in e nin separados
+    por vírgula. Um campo filtrado por igualdade não aceita operadores.
+    `sort=-timestamp,interface` ordena pelos campos, com o
+    `-` para decrescente. Os valores são convertidos pelo tipo do campo no
+    `schema` e campos fora dele são recusados com ValueError.
+    """
+    _query, _sort = {}, []
+
+    for _arg, _values in arguments.items():
+        if _arg in ignore:
+            continue
+
+        _value = _values[-1].decode()
+
+        if _arg == 'sort':
+            for _f in filter(None, _value.split(',')):
+                _name = _f.lstrip('-+')
+
+                if _name not in schema:
+                    raise ValueError(f'Invalid sort field {_name}')
+
+                _sort.append((_name, -1 if _f.startswith('-') else 1))
+            continue
+
+        _name, _, _op = _arg.partition('__')
+
+        if _name not in schema or (_op and _op not in _OPERATORS):
+            raise ValueError(f'Invalid filter {_arg}')
+
+        _type = schema[_name]
+
+        if _op in ('in', 'nin'):
+            _value = [_type(v) for v in _value.split(',')]
+        else:
+            _value = _type(_value)
+
+        # Igualdade e operadores no mesmo campo se anulariam, qualquer que
+        # seja a ordem dos argumentos.
+        if (not _op and _name in _query) or not isinstance(_query.get(_name, {}), dict):
+            raise ValueError(f'Invalid filter {_arg}')
+
+        if _op:
+            _query.setdefault(_name, {})[f'${_op}'] = _value
+        else:
+            _query[_name] = _value
+
+    return _query, _sort
+
+
+def projection(value: str, schema: Dict[str, Callable[[str], Any]]) -> Dict:
+    """
+    Projeção no formato do MongoDB com os campos da lista separada por
+    vírgula. O _id só vem quando pedido.
+    """
+    _fields = [f for f in value.split(',') if f]
+
+    if not _fields:
+        return {}
+
+    for _f in _fields:
+        if _f != '_id' and _f not in schema:
+            raise ValueError(f'Invalid field {_f}')
+
+    _projection = dict.fromkeys(_fields, 1)
+    _projection.setdefault('_id', 0)
+
+    return _projection
+
+
+def match(document: Dict, query: Dict) -> bool:
+    """
+    Avalia em memória uma consulta gerada pelo `parse`.
+    """
+    for _name, _cond in query.items():
+        _v = document.get(_name)
+
+        if not isinstance(_cond, dict):
+            if _v != _cond:
+                return False
+            continue
+
+        for _op, _arg in _cond.items():
+            if _op == '$in':
+                _ok = _v in _arg
+            elif _op == '$nin':
+                _ok = _v not in _arg
+            else:
+                try:
+                    _ok = _COMPARE[_op](_v, _arg)
+                except TypeError:
+                    _ok = False
+
+            if not _ok:
+                return False
+
+    return True
@@ -0,0 +1,204 @@
+import logging
+import struct
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, List
+
+from core.utils.query import match
+from settings.config import CONF
+
+_log = logging.getLogger(__name__)
+
+_MAGIC = b'MONETRB2'
+# Identificador, capacidade, máximo de interfaces, interfaces, amostras
+# escritas e interfaces recusadas por falta de espaço.
+_HEADER = struct.Struct('=8sIIIQI')
+_IFACES_OFFSET = 16
+_COUNT_OFFSET = 20
+_REFUSED_OFFSET = 28
+_NAME = struct.Struct('=32s')
+# Sequência, interface, timestamp, download, upload e as duas velocidades.
+_SLOT = struct.Struct('=QI4xdQQdd')
+
+
+class SampleRing:
+    """
+    Anel em memória compartilhada com as últimas amostras das interfaces.
+
+    O coletor escreve e a API lê sem passar pelo banco. O layout é fixo: um
+    cabeçalho, uma tabela com o nome de cada interface e os slots numéricos.
+    Cada slot guarda a sua sequência, zerada durante a escrita, e o leitor
+    descarta os slots cuja sequência mudou enquanto eram lidos. Amostras de
+    interfaces além de `max_ifaces` não cabem na tabela e ficam só no banco.
+    """
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool) -> None:
+        self._shm = shm
+        self._owner = owner
+        _, self._capacity, self._max_ifaces, _, _, _ = _HEADER.unpack_from(shm.buf)
+        self._slots = _HEADER.size + self._max_ifaces * _NAME.size
+        self._ifaces: Dict[str, int] = {}
+        self._refused = set()
+
+    @classmethod
+    def create(
+            cls,
+            name: str=CONF.latest_buffer_name,
+            capacity: int=CONF.latest_buffer_size,
+            max_ifaces: int=256,
+        ) -> 'SampleRing':
+        _size = _HEADER.size + max_ifaces * _NAME.size + capacity * _SLOT.size
+
+        try:
+            _shm = shared_memory.SharedMemory(name, create=True, size=_size)
+        except FileExistsError:
+            # Sobra de um coletor que não terminou direito. Invalida o
+            # antigo para que os leitores ainda ligados a ele reabram.
+            _old = shared_memory.SharedMemory(name)
+            _old.buf[:len(_MAGIC)] = bytes(len(_MAGIC))
+            _old.close()
+            _old.unlink()
+            _shm = shared_memory.SharedMemory(name, create=True, size=_size)
+
+        _HEADER.pack_into(_shm.buf, 0, _MAGIC, capacity, max_ifaces, 0, 0, 0)
+        return cls(_shm, True)
+
+    @classmethod
+    def attach(cls, name: str=CONF.latest_buffer_name) -> 'SampleRing | None':
+        try:
+            _shm = shared_memory.SharedMemory(name)
+        except FileNotFoundError:
+            return None
+
+        # Quem lê não é dono do segmento, então não deve apagá-lo ao sair.
+        resource_tracker.unregister(_shm._name, 'shared_memory')
+        return cls(_shm, False)
+
+    @property
+    def alive(self) -> bool:
+        return bytes(self._shm.buf[:len(_MAGIC)]) == _MAGIC
+
+    def close(self) -> None:
+        if self._owner:
+            self._shm.buf[:len(_MAGIC)] = bytes(len(_MAGIC))
+            self._shm.close()
+            self._shm.unlink()
+        else:
+            self._shm.close()
+
+    def __interface(self, iface: str) -> int | None:
+        _id = self._ifaces.get(iface)
+
+        if _id is None:
+            _id = len(self._ifaces)
+
+            if _id >= self._max_ifaces:
+                if iface not in self._refused:
+                    self._refused.add(iface)
+                    struct.pack_into('=I', self._shm.buf, _REFUSED_OFFSET, len(self._refused))
+                    _log.warning('Latest buffer is full of interfaces, %s stays only in the database', iface)
+
+                return None
+
+            _NAME.pack_into(self._shm.buf, _HEADER.size + _id * _NAME.size, iface.encode()[:32])
+            self._ifaces[iface] = _id
+            struct.pack_into('=I', self._shm.buf, _IFACES_OFFSET, len(self._ifaces))
+
+        return _id
+
+    def append(self, samples: List[Dict]) -> None:
+        _buf = self._shm.buf
+        _count, = struct.unpack_from('=Q', _buf, _COUNT_OFFSET)
+
+        for _s in samples:
+            _id = self.__interface(_s['interface'])
+
+            if _id is None:
+                continue
+
+            _offset = self._slots + (_count % self._capacity) * _SLOT.size
+            struct.pack_into('=Q', _buf, _offset, 0)
+            _SLOT.pack_into(
+                _buf,
+                _offset,
+                0,
+                _id,
+                _s['timestamp'],
+                _s['download'],
+                _s['updaload'],
+                _s['upload_speed'],
+                _s['download_speed'],
+            )
+            struct.pack_into('=Q', _buf, _offset, _count + 1)
+            _count += 1
+
+        struct.pack_into('=Q', _buf, _COUNT_OFFSET, _count)
+
+    def latest(
+            self,
+            limit: int,
+            start: float | None=None,
+            end: float | None=None,
+            query: Dict={},
+        ) -> List[Dict] | None:
+        """
+        Amostras mais recentes primeiro, opcionalmente só as do período e
+        as que atendem à consulta. None quando alguma interface foi
+        recusada, pois a resposta poderia estar incompleta.
+        """
+        _buf = self._shm.buf
+        _, _, _, _n, _count, _refused = _HEADER.unpack_from(_buf)
+
+        if _refused:
+            return None
+        _names = [
+            _NAME.unpack_from(_buf, _HEADER.size + i * _NAME.size)[0].rstrip(b'\0').decode()
+            for i in range(_n)
+        ]
+        _response = []
+
+        for _seq in range(_count, max(0, _count - self._capacity), -1):
+            _offset = self._slots + ((_seq - 1) % self._capacity) * _SLOT.size
+            _slot = _SLOT.unpack_from(_buf, _offset)
+
+            if _slot[0] != _seq or struct.unpack_from('=Q', _buf, _offset)[0] != _seq:
+                continue
+
+            _, _id, _ts, _down, _up, _uspeed, _dspeed = _slot
+
+            if end is not None and _ts >= end:
+                continue
+            if start is not None and _ts < start:
+                break
+
+            _sample = {
+                'interface': _names[_id] if _id < len(_names) else None,
+                'download': _down,
+                'updaload': _up,
+                'upload_speed': _uspeed,
+                'download_speed': _dspeed,
+                'timestamp': _ts,
+            }
+
+            if query and not match(_sample, query):
+                continue
+
+            _response.append(_sample)
+
+            if len(_response) >= limit:
+                break
+
+        return _response
+
+    def oldest(self) -> float | None:
+        """
+        Timestamp da amostra mais antiga ainda no anel.
+        """
+        _count, = struct.unpack_from('=Q', self._shm.buf, _COUNT_OFFSET)
+
+        if not _count:
+            return None
+
+        _seq = max(1, _count - self._capacity + 1)
+        _offset = self._slots + ((_seq - 1) % self._capacity) * _SLOT.size
+        _slot = _SLOT.unpack_from(self._shm.buf, _offset)
+
+        return _slot[2] if _slot[0] == _seq else None
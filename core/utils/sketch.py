@@ -0,0 +1,145 @@
+import hashlib
+import heapq
+import itertools
+import math
+import zlib
+from typing import Any, Dict, Hashable, Iterable, List
+
+from settings.config import CONF
+
+
+class SpaceSaving:
+    """
+    Sketch Space-Saving ponderado para os itens mais pesados de um fluxo.
+
+    Mantém no máximo `capacity` contadores. Quando um item novo chega com a
+    tabela cheia, ele herda o contador do menor item, que vira o seu erro
+    máximo. O menor item é achado por um heap com entradas preguiçosas, já
+    que os contadores só crescem.
+    """
+    def __init__(self, capacity: int) -> None:
+        self._capacity = max(1, capacity)
+        self._counters = {}  # item -> [valor, erro]
+        self._heap = []  # (valor, desempate, item), possivelmente desatualizado
+        self._seq = itertools.count()
+
+    def add(self, item: Hashable, weight: int=1) -> None:
+        _c = self._counters.get(item)
+
+        if _c is not None:
+            _c[0] += weight
+            return
+
+        if len(self._counters) < self._capacity:
+            self._counters[item] = [weight, 0]
+            heapq.heappush(self._heap, (weight, next(self._seq), item))
+            return
+
+        while True:
+            _value, _, _item = heapq.heappop(self._heap)
+            _current = self._counters[_item][0]
+
+            if _current == _value:
+                break
+
+            heapq.heappush(self._heap, (_current, next(self._seq), _item))
+
+        del self._counters[_item]
+        self._counters[item] = [_value + weight, _value]
+        heapq.heappush(self._heap, (_value + weight, next(self._seq), item))
+
+    def top(self, k: int | None=None) -> List[List[Any]]:
+        """
+        Devolve [item, valor, erro] dos k maiores itens.
+        """
+        _items = sorted(self._counters.items(), key=lambda i: i[1][0], reverse=True)
+        return [[i, c[0], c[1]] for i, c in _items[:k]]
+
+    @property
+    def minimum(self) -> int:
+        """
+        Maior valor que um item fora do sketch pode ter tido: o menor
+        contador com a tabela cheia, zero antes disso.
+        """
+        if len(self._counters) < self._capacity:
+            return 0
+
+        return min(c[0] for c in self._counters.values())
+
+    @staticmethod
+    def merge(snapshots: Iterable[Dict], k: int | None=None) -> List[List[Any]]:
+        """
+        Soma snapshots com `items` ([{key, value, error}]) e `minimum` e
+        devolve [item, valor, erro] dos k maiores. Um item ausente de um
+        snapshot pode ter tido até o `minimum` dele, que entra no valor e
+        no erro, para o valor continuar sendo um limite superior.
+        """
+        _merged = {}  # item -> [valor, erro, soma dos mínimos onde aparece]
+        _minimum = 0
+
+        for _snapshot in snapshots:
+            _min = _snapshot.get('minimum', 0)
+            _minimum += _min
+
+            for _i in _snapshot['items']:
+                _key = tuple(_i['key']) if isinstance(_i['key'], list) else _i['key']
+                _m = _merged.setdefault(_key, [0, 0, 0])
+                _m[0] += _i['value']
+                _m[1] += _i['error']
+                _m[2] += _min
+
+        _items = [[i, v + _minimum - p, e + _minimum - p] for i, (v, e, p) in _merged.items()]
+        _items.sort(key=lambda i: i[1], reverse=True)
+
+        return [[list(i) if isinstance(i, tuple) else i, v, e] for i, v, e in _items[:k]]
+
+
+class HyperLogLog:
+    """
+    Sketch HyperLogLog para contagem aproximada de itens distintos.
+
+    Usa 2^precision registradores de um byte, o erro padrão é de cerca de
+    1.04 / sqrt(2^precision). Sketches de mesma precisão são combinados
+    pelo máximo de cada registrador, então janelas podem ser somadas sem
+    rever os dados.
+    """
+    def __init__(self, precision: int=CONF.hll_precision, registers: bytes | None=None) -> None:
+        self.precision = precision
+        self._m = 1 << precision
+        self._shift = 64 - precision
+        self._mask = (1 << self._shift) - 1
+        self.registers = bytearray(registers) if registers else bytearray(self._m)
+
+    def add(self, item: str) -> None:
+        _h = int.from_bytes(hashlib.blake2b(item.encode(), digest_size=8).digest(), 'big')
+        _idx = _h >> self._shift
+        _w = _h & self._mask
+        # Posição do primeiro bit 1 nos bits restantes do hash.
+        _rank = self._shift - _w.bit_length() + 1
+
+        if _rank > self.registers[_idx]:
+            self.registers[_idx] = _rank
+
+    def merge(self, other: 'HyperLogLog') -> None:
+        if other.precision != self.precision:
+            raise ValueError('Cannot merge sketches with different precision')
+
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        _alpha = 0.7213 / (1 + 1.079 / self._m)
+        _estimate = _alpha * self._m ** 2 / sum(2.0 ** -r for r in self.registers)
+        _zeros = self.registers.count(0)
+
+        # Correção para cardinalidades pequenas (linear counting).
+        if _estimate <= 2.5 * self._m and _zeros:
+            _estimate = self._m * math.log(self._m / _zeros)
+
+        return round(_estimate)
+
+    def to_bytes(self) -> bytes:
+        return zlib.compress(bytes(self.registers))
+
+    @classmethod
+    def from_bytes(cls, data: bytes, precision: int) -> 'HyperLogLog':
+        return cls(precision, zlib.decompress(data))
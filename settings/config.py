@@ -4,13 +4,62 @@ import logging.config as logging
 class Config:
     refresh_time: int
     log_level: str
+    db_engine: str
     db_host: str
     db_port: int
     db_name: str
     db_expire_time: int
     db_response_limit: int
+    page_max_limit: int
+    stream_batch_size: int
+    response_cache_entries: int
+    response_cache_bytes: int
+    db_time_series: bool
+    sqlite_path: str
+    sqlite_prune_interval: int
     debug: bool
     secret_key: str
+    collector_backend: str
+    collector_max_pending: int
+    proc_inode_refresh: int
+    connection_checkpoint: int
+    connection_expire_time: int
+    rollup_tiers: dict
+    latest_buffer_size: int
+    latest_buffer_name: str
+    process_cache_size: int
+    spool_enabled: bool
+    spool_dir: str
+    spool_segment_size: int
+    spool_batch_size: int
+    pkg_batch_size: int
+    pkg_batch_latency: float
+    pkg_queue_size: int
+    capture_queue_policy: str
+    capture_stats_interval: int
+    capture_engine: str
+    capture_interfaces: list
+    capture_mode: str
+    capture_workers: int
+    capture_fanout: bool
+    capture_filter: str
+    capture_iface_filters: dict
+    capture_exclude_db: bool
+    sampling_mode: str
+    sampling_rate: int
+    sampling_max_rate: int
+    sampling_high_water: float
+    sampling_low_water: float
+    flow_window: int
+    top_talkers: bool
+    top_window: int
+    top_capacity: int
+    distinct_peers: bool
+    distinct_bucket: int
+    hll_precision: int
+    tpacket_block_size: int
+    tpacket_block_count: int
+    tpacket_block_timeout: int
 
     def __init__(self) -> None:
         __content__ = self.__conf_load__()
@@ -18,13 +67,64 @@ class Config:
         try:
             self.refresh_time = __content__.get('refreshTime', 1)
             self.log_level = __content__.get('logLevel', 'info').upper()
+            self.db_engine = __content__.get('storageEngine', 'mongo').lower()
             self.db_host = __content__.get('mongoHost', 'mongodb://127.0.0.1')
             self.db_port = __content__.get('mongoPort', 27017)
             self.db_name = __content__.get('mongoName', 'monet')
             self.db_expire_time = __content__.get('mongoExpireDataSeconds', 3600)
             self.db_response_limit = __content__.get('mongoResponseLimit', 100)
+            self.page_max_limit = __content__.get('pageMaxLimit', 1000)
+            self.stream_batch_size = __content__.get('streamBatchSize', 500)
+            self.response_cache_entries = __content__.get('responseCacheEntries', 256)
+            self.response_cache_bytes = __content__.get('responseCacheBytes', 1 << 25)
+            self.db_time_series = __content__.get('mongoTimeSeries', False)
+            self.sqlite_path = __content__.get('sqlitePath', 'monet.db')
+            self.sqlite_prune_interval = __content__.get('sqlitePruneInterval', 60)
             self.debug = __content__.get('debug', False)
             self.secret_key = __content__.get('appSecretKey', 'serw#%@rqdÀWRPA`SDosd123@!13qweqsd-as=-%¨&ÏYJ')
+            self.collector_backend = __content__.get('collectorBackend', 'psutil').lower()
+            self.collector_max_pending = __content__.get('collectorMaxPendingWrites', 8)
+            self.proc_inode_refresh = __content__.get('procInodeRefresh', 30)
+            self.connection_checkpoint = __content__.get('connectionCheckpoint', 300)
+            self.connection_expire_time = __content__.get('connectionExpireTime', 900)
+            self.process_cache_size = __content__.get('processCacheSize', 4096)
+            self.latest_buffer_size = __content__.get('latestBufferSize', 3600)
+            self.latest_buffer_name = __content__.get('latestBufferName', 'monet')
+            self.rollup_tiers = {
+                int(k): v for k, v in __content__.get('rollupTiers', {'60': 86400, '900': 1209600, '3600': 7776000}).items()
+            }
+            self.spool_enabled = __content__.get('spoolEnabled', False)
+            self.spool_dir = __content__.get('spoolDir', 'spool')
+            self.spool_segment_size = __content__.get('spoolSegmentSize', 1 << 24)
+            self.spool_batch_size = __content__.get('spoolBatchSize', 5000)
+            self.pkg_batch_size = __content__.get('packageBatchSize', 500)
+            self.pkg_batch_latency = __content__.get('packageBatchLatency', 1)
+            self.pkg_queue_size = __content__.get('packageQueueSize', 10000)
+            self.capture_queue_policy = __content__.get('captureQueuePolicy', 'block').lower()
+            self.capture_stats_interval = __content__.get('captureStatsInterval', 60)
+            self.capture_engine = __content__.get('captureEngine', 'scapy').lower()
+            self.capture_interfaces = __content__.get('captureInterfaces', [])
+            self.capture_mode = __content__.get('captureMode', 'raw').lower()
+            self.capture_workers = __content__.get('captureWorkers', 1)
+            self.capture_fanout = __content__.get('captureFanout', False)
+            self.capture_filter = __content__.get('captureFilter', '')
+            self.capture_iface_filters = __content__.get('captureInterfaceFilters', {})
+            self.capture_exclude_db = __content__.get('captureExcludeDatabase', True)
+            self.sampling_mode = __content__.get('samplingMode', 'none').lower()
+            self.sampling_rate = __content__.get('samplingRate', 1)
+            self.sampling_max_rate = __content__.get('samplingMaxRate', 1024)
+            self.sampling_high_water = __content__.get('samplingHighWater', 0.8)
+            self.sampling_low_water = __content__.get('samplingLowWater', 0.2)
+            self.flow_window = __content__.get('flowWindow', 60)
+            self.top_talkers = __content__.get('topTalkers', False)
+            self.top_window = __content__.get('topWindow', 60)
+            self.top_capacity = __content__.get('topCapacity', 100)
+            self.distinct_peers = __content__.get('distinctPeers', False)
+            self.distinct_bucket = __content__.get('distinctBucket', 300)
+            self.hll_precision = __content__.get('hllPrecision', 12)
+            self.tpacket_block_size = __content__.get('tpacketBlockSize', 1 << 22)
+            self.tpacket_block_count = __content__.get('tpacketBlockCount', 64)
+            self.tpacket_block_timeout = __content__.get('tpacketBlockTimeout', 100)
         except KeyError as e:
             print('Miss config propertie!')
             raise Exception(e.args)